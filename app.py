@@ -1,12 +1,18 @@
 import streamlit as st
 from auth import login_page, signup_page, logout_button
-from workout_recommendation import workout_recommendation, duration_based_workouts, workout_history, progress_dashboard
+from workout_recommendation import workout_recommendation, duration_based_workouts, group_workouts, workout_history, progress_dashboard
 import os
+import uuid
+import metrics
+import profiling
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Start the latency metrics endpoint / log line if configured
+metrics.start_exporters()
+
 # Define predefined themes with safe defaults
 THEMES = {
     "Cyberpunk": {
@@ -172,6 +178,11 @@ if 'user_id' not in st.session_state:
     st.session_state['user_id'] = None
 if 'custom_theme' not in st.session_state:
     st.session_state['custom_theme'] = None
+if 'trace_sampled' not in st.session_state:
+    st.session_state['trace_sampled'] = metrics.should_sample()
+# Opaque id that ties a session's traces together without writing usernames to disk
+if 'trace_session_id' not in st.session_state:
+    st.session_state['trace_session_id'] = uuid.uuid4().hex
 
 # Apply the selected theme with fallback
 try:
@@ -191,6 +202,7 @@ if st.session_state.get('logged_in'):
     choice = st.sidebar.radio("Choose an option", [
         "Emotion-Based Workouts",
         "Duration-Based Workouts",
+        "Group Session",
         "Workout History",
         "Progress Dashboard",
         "Profile",
@@ -199,19 +211,31 @@ if st.session_state.get('logged_in'):
 else:
     choice = st.sidebar.radio("Choose an option", ["Login", "Sign Up"])
 
-# Pages
+# Pages (sampled sessions get a full per-stage trace of each page run, and a
+# PROFILE_SAMPLE_RATE share of page runs is profiled)
+trace_sampled = st.session_state['trace_sampled']
+trace_session = st.session_state['trace_session_id']
 if choice == "Login":
-    login_page()
+    with metrics.trace("login", trace_sampled, trace_session), profiling.profile_page("login"):
+        login_page()
 elif choice == "Sign Up":
-    signup_page()
+    with metrics.trace("signup", trace_sampled, trace_session), profiling.profile_page("signup"):
+        signup_page()
 elif choice == "Emotion-Based Workouts" and st.session_state.get('logged_in'):
-    workout_recommendation()
+    with metrics.trace("emotion_workouts", trace_sampled, trace_session), profiling.profile_page("emotion_workouts"):
+        workout_recommendation()
 elif choice == "Duration-Based Workouts" and st.session_state.get('logged_in'):
-    duration_based_workouts()
+    with metrics.trace("duration_workouts", trace_sampled, trace_session), profiling.profile_page("duration_workouts"):
+        duration_based_workouts()
+elif choice == "Group Session" and st.session_state.get('logged_in'):
+    with metrics.trace("group_session", trace_sampled, trace_session), profiling.profile_page("group_session"):
+        group_workouts()
 elif choice == "Workout History" and st.session_state.get('logged_in'):
-    workout_history()
+    with metrics.trace("workout_history", trace_sampled, trace_session), profiling.profile_page("workout_history"):
+        workout_history()
 elif choice == "Progress Dashboard" and st.session_state.get('logged_in'):
-    progress_dashboard()
+    with metrics.trace("progress_dashboard", trace_sampled, trace_session), profiling.profile_page("progress_dashboard"):
+        progress_dashboard()
 elif choice == "Profile" and st.session_state.get('logged_in'):
     st.title("Profile")
     st.markdown(f"""
@@ -1,9 +1,13 @@
 import streamlit as st
-from database import init_db, create_user, authenticate, save_face_embedding, get_face_embedding, get_db_connection
-from deepface import DeepFace
-import cv2
+from database import init_db, create_user, authenticate, save_face_embedding, get_face_embeddings, get_db_connection
+from inference_backend import get_backend
 import numpy as np
 import time
+from metrics import timed
+import plan_prefetch
+from camera import open_camera
+from camera_preview import CameraPreview
+from face_models import FACE_MODEL, model_settings, distance as embedding_distance
 
 # Initialize the database
 init_db()
@@ -11,21 +15,23 @@ init_db()
 # Capture face embedding with timeout
 def capture_face_embedding():
     st.write("Please look at the camera for Face ID registration...")
-    cap = cv2.VideoCapture(0)
+    cap = open_camera()
     embedding = None
-    video_placeholder = st.empty()
+    preview = CameraPreview(st.empty())
     timeout = 30
     start_time = time.time()
 
     while time.time() - start_time < timeout:
-        ret, frame = cap.read()
+        with timed('camera_read'):
+            ret, frame = cap.read()
         if not ret:
             st.error("Failed to capture video. Please check your webcam.")
             break
-        video_placeholder.image(frame, channels="BGR", use_container_width=True)
+        preview.submit(frame)
 
         try:
-            embedding = DeepFace.represent(frame, model_name="Facenet", enforce_detection=True)
+            with timed('deepface_represent'):
+                embedding = get_backend().represent(frame, model_name=FACE_MODEL, enforce_detection=True)
             if embedding:
                 st.success("Face captured successfully!")
                 break
@@ -34,43 +40,47 @@ def capture_face_embedding():
     else:
         st.error("Face capture timed out. Please try again.")
 
+    preview.stop()
     cap.release()
-    cv2.destroyAllWindows()
     return embedding[0]["embedding"] if embedding else None
 
 # Verify face embedding with timeout
 def verify_face_embedding(user_id):
     st.write("Please look at the camera for Face ID verification...")
-    cap = cv2.VideoCapture(0)
+    cap = open_camera()
     verified = False
-    video_placeholder = st.empty()
+    preview = CameraPreview(st.empty())
     timeout = 30
     start_time = time.time()
 
-    conn = get_db_connection()
-    result = conn.execute("SELECT embedding FROM face_embeddings WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
+    # Compare against the embedding from the configured model, or else the
+    # newest one from whichever model enrolled this user
+    stored = get_face_embeddings(user_id, preferred_model=FACE_MODEL)
 
-    if result:
-        stored_embedding_bytes = result["embedding"]
-        stored_embedding = np.frombuffer(stored_embedding_bytes, dtype=np.float64)
+    if stored:
+        stored_model, stored_embedding = stored[0]
+        metric, threshold = model_settings(stored_model)
 
         while time.time() - start_time < timeout:
-            ret, frame = cap.read()
+            with timed('camera_read'):
+                ret, frame = cap.read()
             if not ret:
                 st.error("Failed to capture video. Please check your webcam.")
                 break
-            video_placeholder.image(frame, channels="BGR", use_container_width=True)
+            preview.submit(frame)
 
             try:
-                embedding = DeepFace.represent(frame, model_name="Facenet", enforce_detection=True)
+                with timed('deepface_represent'):
+                    embedding = get_backend().represent(frame, model_name=stored_model, enforce_detection=True)
                 if embedding:
                     current_embedding = np.array(embedding[0]["embedding"])
-                    distance = np.linalg.norm(current_embedding - stored_embedding)
+                    distance = embedding_distance(current_embedding, stored_embedding, metric)
 
-                    if distance < 10:
+                    if distance < threshold:
                         st.success("Face ID verified successfully!")
                         verified = True
+                        if stored_model != FACE_MODEL:
+                            enroll_current_model(user_id, frame)
                         break
                     else:
                         st.warning("Face not matched. Try again...")
@@ -82,10 +92,20 @@ def verify_face_embedding(user_id):
     else:
         st.error("No Face ID data found for this user.")
 
+    preview.stop()
     cap.release()
-    cv2.destroyAllWindows()
     return verified
 
+# Re-enroll a verified user under the configured model after a model switch
+def enroll_current_model(user_id, frame):
+    try:
+        with timed('deepface_represent'):
+            embedding = get_backend().represent(frame, model_name=FACE_MODEL, enforce_detection=True)
+        if embedding:
+            save_face_embedding(user_id, embedding[0]["embedding"], model_name=FACE_MODEL)
+    except Exception:
+        pass
+
 # Login Page
 def login_page():
     st.title("Login")
@@ -95,9 +115,12 @@ def login_page():
         submitted = st.form_submit_button("Login")
 
     if submitted:
-        user = authenticate(username, password)
+        with timed('login_password'):
+            user = authenticate(username, password)
         if user:
-            if verify_face_embedding(user['id']):
+            with timed('login_face_verification'):
+                face_verified = verify_face_embedding(user['id'])
+            if face_verified:
                 st.session_state['logged_in'] = True
                 st.session_state['username'] = user['username']
                 st.session_state['email'] = user['email']
@@ -131,7 +154,7 @@ def signup_page():
                 if result == True:
                     conn = get_db_connection()
                     user_id = conn.execute("SELECT id FROM users WHERE username = ?", (new_username,)).fetchone()["id"]
-                    save_face_embedding(user_id, face_embedding)
+                    save_face_embedding(user_id, face_embedding, model_name=FACE_MODEL)
                     conn.close()
                     st.success("Account created successfully! Please log in.")
                 else:
@@ -142,6 +165,7 @@ def signup_page():
 # Logout Button
 def logout_button():
     if st.sidebar.button("Logout"):
+        plan_prefetch.cancel_session(st.session_state)
         st.session_state['logged_in'] = False
         st.session_state['username'] = None
         st.session_state['email'] = None
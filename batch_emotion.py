@@ -0,0 +1,203 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from emotion_analysis import mood_scores
+
+# Offline emotion analysis over recorded videos and image folders.
+# Frames are decoded as a stream in the parent process (every --stride'th frame),
+# analyzed by a pool of inference worker processes, and summarized per source
+# (one video file or one image directory) with a recommended workout plan.
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+# Worker: create the configured inference backend once per process
+def _init_worker():
+    global _backend
+    from inference_backend import get_backend
+    _backend = get_backend()
+
+
+# Worker: dominant emotion of the first face, or None when no face is found
+def _analyze_frame(task):
+    source, frame = task
+    try:
+        result = _backend.analyze_emotion(frame, enforce_detection=True)
+        return source, result[0]['dominant_emotion'].capitalize()
+    except Exception:
+        return source, None
+
+
+# Expand the command-line inputs into (source, kind) pairs
+def discover_sources(inputs):
+    sources = []
+    for path in inputs:
+        if os.path.isdir(path):
+            found = len(sources)
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                if any(f.lower().endswith(IMAGE_EXTENSIONS) for f in files):
+                    sources.append((root, 'images'))
+                sources.extend((os.path.join(root, f), 'video') for f in sorted(files)
+                               if f.lower().endswith(VIDEO_EXTENSIONS))
+            if len(sources) == found:
+                print(f"No videos or images found in {path}", file=sys.stderr)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            sources.append((path, 'video'))
+        else:
+            print(f"Skipping unsupported input {path}", file=sys.stderr)
+    return sources
+
+
+# Stream every stride'th frame of a source without holding the file in memory
+def iter_frames(source, kind, stride, max_frames=None):
+    emitted = 0
+    if kind == 'images':
+        names = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[::stride]:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is None:
+                continue
+            yield frame
+            emitted += 1
+            if max_frames and emitted >= max_frames:
+                return
+        return
+    cap = cv2.VideoCapture(source)
+    index = 0
+    try:
+        while True:
+            # grab() skips decoding for frames we are not going to analyze
+            if index % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            yield frame
+            emitted += 1
+            if max_frames and emitted >= max_frames:
+                break
+    finally:
+        cap.release()
+
+
+# Per-source mood summary in the same shape detect_emotion() returns
+def summarize(source, kind, counts, frames):
+    mood_totals = Counter()
+    for emotion, count in counts.items():
+        if emotion is not None:
+            for mood, weight in mood_scores(emotion).items():
+                mood_totals[mood] += weight * count
+    moods = [mood for mood, _ in mood_totals.most_common(3)]
+    faces = sum(v for k, v in counts.items() if k is not None)
+    return {
+        'source': source,
+        'kind': kind,
+        'frames_analyzed': frames,
+        'faces_detected': faces,
+        'emotion_counts': {k: v for k, v in counts.items() if k is not None},
+        'moods': moods,
+    }
+
+
+# Attach the workout plan recommend_workouts() would give for these moods
+def attach_plans(summaries):
+    from recommendations import recommend_workouts
+    for summary in summaries:
+        plan = recommend_workouts(summary['moods']) if summary['moods'] else []
+        summary['plan'] = [{'name': w['Exercise'], 'sets': w['Sets'], 'duration': int(w['Duration'])} for w in plan]
+    return summaries
+
+
+def write_results(summaries, output, fmt):
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        if fmt == 'jsonl':
+            for summary in summaries:
+                out.write(json.dumps(summary) + '\n')
+        else:
+            writer = csv.writer(out)
+            writer.writerow(['source', 'kind', 'frames_analyzed', 'faces_detected', 'moods', 'emotion_counts', 'plan'])
+            for s in summaries:
+                writer.writerow([
+                    s['source'], s['kind'], s['frames_analyzed'], s['faces_detected'],
+                    '|'.join(s['moods']), json.dumps(s['emotion_counts']),
+                    '|'.join(w['name'] for w in s.get('plan', [])),
+                ])
+    finally:
+        if output:
+            out.close()
+
+
+def run(sources, stride, workers, max_frames=None, max_in_flight=None):
+    max_in_flight = max_in_flight or workers * 4
+    counts = {source: Counter() for source, _ in sources}
+    frames = Counter()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+
+        def drain(limit):
+            while len(pending) > limit:
+                source, emotion = pending.popleft().result()
+                counts[source][emotion] += 1
+                frames[source] += 1
+
+        for source, kind in sources:
+            for frame in iter_frames(source, kind, stride, max_frames):
+                pending.append(pool.submit(_analyze_frame, (source, frame)))
+                # Bounded in-flight work keeps decoded frames from piling up in memory
+                drain(max_in_flight)
+        drain(0)
+    elapsed = time.perf_counter() - start
+    summaries = [summarize(source, kind, counts[source], frames[source]) for source, kind in sources]
+    return summaries, sum(frames.values()), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze emotions in recorded videos and image folders.")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or directories of videos or images")
+    parser.add_argument('--stride', type=int, default=5, help="Analyze every Nth frame (default: 5)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Inference processes")
+    parser.add_argument('--max-frames', type=int, help="Stop after this many analyzed frames per source")
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'],
+                        help="Output format (default: from --output extension, else csv)")
+    parser.add_argument('--no-plans', action='store_true', help="Skip workout plan recommendations")
+    args = parser.parse_args(argv)
+
+    if args.stride < 1 or args.workers < 1:
+        parser.error("--stride and --workers must be at least 1")
+    fmt = args.format or ('jsonl' if args.output and args.output.endswith('.jsonl') else 'csv')
+    sources = discover_sources(args.inputs)
+    if not sources:
+        print("Nothing to analyze.", file=sys.stderr)
+        return 1
+
+    summaries, total_frames, elapsed = run(sources, args.stride, args.workers, args.max_frames)
+    if not args.no_plans:
+        attach_plans(summaries)
+    write_results(summaries, args.output, fmt)
+
+    fps = total_frames / elapsed if elapsed else 0.0
+    print(f"Analyzed {total_frames} frames from {len(sources)} source(s) in {elapsed:.1f}s: "
+          f"{fps:.2f} frames/s, {fps / args.workers:.2f} frames/s per core ({args.workers} workers)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,360 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Benchmark suite for the recommendation, database and vision hot paths.
+# Runs offline on CPU: databases are seeded into a temp directory, frames are
+# synthetic unless --frames-dir is given, and DeepFace must find its model
+# weights already cached under ~/.deepface (the vision group is skipped otherwise).
+
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.20
+# Absolute budgets (p95, ms) that fail the run regardless of the baseline
+TARGETS_MS = {
+    "ranking.rank[users=100000,exercises=2000]": 1.0,
+    "ranking.update[users=100000]": 1.0,
+}
+SEED = 1234
+
+# Keep the seeded databases out of users.db before database.py initializes
+_BENCH_DIR = tempfile.mkdtemp(prefix="wellness-bench-")
+os.environ.setdefault("DB_PATH", os.path.join(_BENCH_DIR, "bootstrap.db"))
+
+import database
+
+
+# Time a callable and summarize the samples in milliseconds
+def measure(fn, repeat, warmup=1, setup=None):
+    for _ in range(warmup):
+        args = setup() if setup else ()
+        fn(*args)
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+# Seed a fresh database with users, embeddings, plans and progress rows
+def seed_database(path, n_users, plan_json):
+    # Queued writes and reserved plan ids belong to the previous database
+    database.flush_writes()
+    database._reset_id_block()
+    if os.path.exists(path):
+        os.remove(path)
+    database.DB_PATH = path
+    database.init_db()
+    rng = np.random.default_rng(SEED)
+    # One bcrypt hash for everybody: seeding must not dominate the run
+    password_hash = database.hash_password("benchmark")
+    conn = database.get_db_connection()
+    conn.executemany(
+        "INSERT INTO users (username, email, password, hash_method) VALUES (?, ?, ?, 'bcrypt')",
+        ((f"user{i}", f"user{i}@example.com", password_hash) for i in range(n_users))
+    )
+    conn.executemany(
+        "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
+        ((i + 1, rng.standard_normal(128).tobytes()) for i in range(n_users))
+    )
+    plans_per_user = 5
+    plan_json = database.normalize_plan_json(plan_json)
+    content_hash = database.plan_content_hash(plan_json)
+    conn.execute("INSERT INTO plan_contents (hash, data) VALUES (?, ?)", (content_hash, plan_json))
+    conn.executemany(
+        "INSERT INTO workout_plans (user_id, type, data, content_hash) VALUES (?, ?, '', ?)",
+        ((i % n_users + 1, 'emotion' if i % 2 else 'duration', content_hash) for i in range(n_users * plans_per_user))
+    )
+    conn.executemany(
+        "INSERT INTO progress (user_id, plan_id, completed, feedback) VALUES (?, ?, ?, ?)",
+        ((i % n_users + 1, i + 1, bool(i % 3), "felt great" if i % 4 == 0 else None) for i in range(n_users * plans_per_user))
+    )
+    conn.commit()
+    conn.close()
+
+
+# database.py functions against seeded databases of increasing size
+def bench_database(sizes, repeat, plan_df):
+    results = {}
+    plan_json = plan_df.to_json()
+    embedding = np.random.default_rng(SEED).standard_normal(128)
+    password_hash = database.hash_password("benchmark")
+    results["database.hash_password"] = measure(lambda: database.hash_password("benchmark"), max(3, repeat // 10))
+    results["database.verify_password"] = measure(
+        lambda: database.verify_password("benchmark", password_hash), max(3, repeat // 10)
+    )
+    for size in sizes:
+        path = os.path.join(_BENCH_DIR, f"bench_{size}.db")
+        seed_database(path, size, plan_json)
+        target = size // 2 + 1
+        counter = iter(range(10 ** 9))
+        suffix = f"[{size}]"
+        results["database.get_db_connection" + suffix] = measure(lambda: database.get_db_connection().close(), repeat)
+        results["database.init_db" + suffix] = measure(database.init_db, repeat)
+        results["database.create_user" + suffix] = measure(
+            lambda: database.create_user(f"new{next(counter)}", f"new{next(counter)}@example.com", "benchmark"),
+            max(3, repeat // 10)
+        )
+        results["database.authenticate" + suffix] = measure(
+            lambda: database.authenticate(f"user{target - 1}", "benchmark"), max(3, repeat // 10)
+        )
+        results["database.save_face_embedding" + suffix] = measure(
+            lambda: database.save_face_embedding(target, embedding), repeat
+        )
+        results["database.get_face_embedding" + suffix] = measure(lambda: database.get_face_embedding(target), repeat)
+        results["database.get_face_embeddings" + suffix] = measure(lambda: database.get_face_embeddings(target), repeat)
+        results["database.save_workout_plan" + suffix] = measure(
+            # Flushing inside the timed call measures the write itself under any WRITE_DURABILITY
+            lambda: (database.save_workout_plan(target, 'emotion', plan_df), database.flush_writes()), repeat
+        )
+        results["database.get_workout_plans" + suffix] = measure(lambda: database.get_workout_plans(target), repeat)
+        results["database.save_progress" + suffix] = measure(
+            lambda: (database.save_progress(target, 1, True, "benchmark"), database.flush_writes()), repeat
+        )
+        results["database.get_progress" + suffix] = measure(lambda: database.get_progress(target), repeat)
+    return results
+
+
+# Recommendation, catalog loading and email rendering
+def bench_recommendation(repeat):
+    import workout_recommendation as wr
+    results = {}
+    np.random.seed(SEED)
+
+    def load_uncached():
+        wr.load_workout_data.clear()
+        return wr.load_workout_data()
+
+    results["workout_recommendation.load_workout_data"] = measure(load_uncached, repeat)
+    for moods in (["Happy"], ["Happy", "Sad"], ["Happy", "Sad", "Angry"]):
+        results[f"workout_recommendation.recommend_workouts[{len(moods)}]"] = measure(
+            lambda: wr.recommend_workouts(moods), repeat
+        )
+    for duration in (15, 30, 45, 60):
+        results[f"workout_recommendation.recommend_workouts_by_duration[{duration}]"] = measure(
+            lambda: wr.recommend_workouts_by_duration(duration), repeat
+        )
+    plan = wr.recommend_workouts_by_duration(60)
+    results["workout_recommendation.generate_email_template[duration]"] = measure(
+        lambda: wr.generate_email_template("Benchmark", "bench", 1, plan, duration_info=60), repeat
+    )
+    results["workout_recommendation.generate_email_template[emotion]"] = measure(
+        lambda: wr.generate_email_template("Benchmark", "bench", 1, plan, emotions=["Happy", "Sad"]), repeat
+    )
+    return results, plan
+
+
+# Personalized ranking at production scale: synthetic catalog and affinity matrix
+def bench_ranking(repeat, users=100000, exercises=2000, per_user=20):
+    import pandas as pd
+    from ranking import RankingEngine
+    rng = np.random.default_rng(SEED)
+    moods = ['happy', 'sad', 'angry', 'neutral', 'fear', 'surprise', 'disgust']
+    catalog = pd.DataFrame({
+        'Exercise': [f"Exercise {i}" for i in range(exercises)],
+        'Sets': "3 sets of 12 reps",
+        'Video_Link': "",
+        'Duration': rng.integers(2, 6, exercises),
+        'Mood': [[moods[i % len(moods)], moods[(i * 3 + 1) % len(moods)]] for i in range(exercises)],
+    })
+    engine = RankingEngine(catalog)
+    start = time.perf_counter()
+    engine.load_arrays(np.repeat(np.arange(users), per_user),
+                       rng.integers(0, exercises, users * per_user),
+                       rng.normal(0.5, 1.0, users * per_user))
+    results = {"ranking.load_arrays[users=%d]" % users: {"repeat": 1, "median_ms": (time.perf_counter() - start) * 1000}}
+    user_ids = iter(rng.integers(0, users, 10 ** 6).tolist())
+    names = catalog['Exercise'].to_numpy()
+    results[f"ranking.rank[users={users},exercises={exercises}]"] = measure(
+        lambda: engine.rank(['Happy', 'Sad'], next(user_ids)), repeat * 10, warmup=10
+    )
+    results[f"ranking.update[users={users}]"] = measure(
+        lambda: engine.update(next(user_ids), names[rng.integers(0, exercises, 10)], 1.0), repeat * 10, warmup=10
+    )
+    return results
+
+
+# A representative plan DataFrame without importing the Streamlit app
+def sample_plan():
+    import pandas as pd
+    df = pd.read_csv("mood_based_workouts_updated.csv").head(15)
+    return df.rename(columns={'Exercise': 'name', 'Sets': 'type', 'Video_Link': 'link', 'Duration': 'duration'})[
+        ['name', 'type', 'link', 'duration']
+    ]
+
+
+# Deterministic frames: bundled images if given, otherwise seeded noise
+def load_frames(frames_dir, count=8):
+    if frames_dir:
+        import cv2
+        names = sorted(n for n in os.listdir(frames_dir) if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+        frames = [cv2.imread(os.path.join(frames_dir, n)) for n in names[:count]]
+        return [f for f in frames if f is not None]
+    rng = np.random.default_rng(SEED)
+    return [rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+# DeepFace represent/analyze over a fixed frame set
+def bench_vision(repeat, frames_dir):
+    try:
+        from deepface import DeepFace
+    except ImportError:
+        print("deepface not installed, skipping vision benchmarks", file=sys.stderr)
+        return {}
+    frames = load_frames(frames_dir)
+    if not frames:
+        print("No frames found, skipping vision benchmarks", file=sys.stderr)
+        return {}
+    cycle = iter(range(10 ** 9))
+
+    def next_frame():
+        return (frames[next(cycle) % len(frames)],)
+
+    results = {}
+    try:
+        results["DeepFace.represent[Facenet]"] = measure(
+            lambda frame: DeepFace.represent(frame, model_name="Facenet", enforce_detection=False),
+            repeat, warmup=2, setup=next_frame
+        )
+        results["DeepFace.analyze[emotion]"] = measure(
+            lambda frame: DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False),
+            repeat, warmup=2, setup=next_frame
+        )
+        from inference_backend import get_backend
+        backend = get_backend()
+        if backend.name != 'deepface':
+            results[f"backend.represent[{backend.name},Facenet]"] = measure(
+                lambda frame: backend.represent(frame, model_name="Facenet", enforce_detection=False),
+                repeat, warmup=2, setup=next_frame
+            )
+            results[f"backend.analyze_emotion[{backend.name}]"] = measure(
+                lambda frame: backend.analyze_emotion(frame, enforce_detection=False),
+                repeat, warmup=2, setup=next_frame
+            )
+    except Exception as e:
+        print(f"Vision benchmarks failed (are model weights cached offline?): {e}", file=sys.stderr)
+    return results
+
+
+# Benchmarks whose p95 is over their absolute budget
+def check_targets(results):
+    failures, lines = [], []
+    for name, budget in TARGETS_MS.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        ok = result["p95_ms"] < budget
+        lines.append(f"{name}: p95 {result['p95_ms']:.3f} ms (budget {budget:.1f} ms){'' if ok else '  OVER BUDGET'}")
+        if not ok:
+            failures.append(name)
+    return failures, lines
+
+
+# Compare medians against the stored baseline
+def compare(results, baseline, threshold):
+    regressions = []
+    lines = []
+    for name, current in sorted(results.items()):
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            lines.append(f"  NEW   {name}: {current['median_ms']:.3f} ms")
+            continue
+        ratio = current["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        status = "OK"
+        if ratio > 1 + threshold:
+            status = "SLOW"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "FAST"
+        lines.append(f"  {status:5} {name}: {base['median_ms']:.3f} -> {current['median_ms']:.3f} ms ({ratio:.2f}x)")
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recommendation, database and vision hot paths.")
+    parser.add_argument("--groups", default="recommendation,database,ranking,vision",
+                        help="Comma-separated groups to run (recommendation, database, ranking, vision)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Seeded user counts for the database group")
+    parser.add_argument("--repeat", type=int, default=30, help="Samples per benchmark")
+    parser.add_argument("--frames-dir", help="Directory of images to use instead of synthetic frames")
+    parser.add_argument("--output", help="Write results JSON to this path (default: stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed median slowdown before failing (0.20 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with this run")
+    args = parser.parse_args(argv)
+
+    groups = {g.strip() for g in args.groups.split(",") if g.strip()}
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    plan = None
+    if "recommendation" in groups:
+        recommendation_results, plan = bench_recommendation(args.repeat)
+        results.update(recommendation_results)
+    if "database" in groups:
+        if plan is None:
+            plan = sample_plan()
+        results.update(bench_database(sizes, args.repeat, plan))
+    if "ranking" in groups:
+        results.update(bench_ranking(args.repeat))
+    if "vision" in groups:
+        results.update(bench_vision(max(3, args.repeat // 5), args.frames_dir))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    over_budget, lines = check_targets(results)
+    if lines:
+        print("\n".join(lines), file=sys.stderr)
+    if over_budget:
+        print(f"{len(over_budget)} benchmark(s) over their absolute budget", file=sys.stderr)
+        return 1
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(payload)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one", file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions, lines = compare(results, baseline, args.threshold)
+    print("\n".join(lines), file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Frame source for the webcam flows. CAMERA_SOURCE is a device index (default
+# 0), a video file or stream URL, or "synthetic[:<image dir>]" for a fake
+# camera that replays images from a directory (or generated frames) at
+# SYNTHETIC_CAMERA_FPS, used for load tests and machines without a webcam.
+CAMERA_SOURCE = os.getenv('CAMERA_SOURCE', '0')
+SYNTHETIC_CAMERA_FPS = float(os.getenv('SYNTHETIC_CAMERA_FPS', '30'))
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+# Generated stand-in frame: a face-like oval on a gradient, with sensor noise
+def synthetic_frame(width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(40, 200, width, dtype=np.float32)
+    frame = np.repeat(np.tile(gradient, (height, 1))[:, :, None], 3, axis=2)
+    cv2.ellipse(frame, (width // 2, height // 2), (width // 7, height // 4), 0, 0, 360, (140, 170, 210), -1)
+    for dx in (-1, 1):
+        cv2.circle(frame, (width // 2 + dx * width // 18, height // 2 - height // 14), height // 40, (40, 40, 40), -1)
+    frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def load_frames(directory):
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            frame = cv2.imread(os.path.join(directory, name))
+            if frame is not None:
+                frames.append(frame)
+    return frames
+
+
+# Drop-in for the parts of cv2.VideoCapture the app uses
+class SyntheticCamera:
+    def __init__(self, frames=None, fps=SYNTHETIC_CAMERA_FPS):
+        self.frames = frames or [synthetic_frame(seed=i) for i in range(8)]
+        self.interval = 1 / fps if fps > 0 else 0
+        self.index = 0
+        self.next_frame_at = time.monotonic()
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    # Pace reads like a real device delivering frames at a fixed rate
+    def grab(self):
+        if not self.opened:
+            return False
+        delay = self.next_frame_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame_at = max(self.next_frame_at, time.monotonic()) + self.interval
+        self.index += 1
+        return True
+
+    def retrieve(self):
+        if not self.opened:
+            return False, None
+        return True, self.frames[(self.index - 1) % len(self.frames)].copy()
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return 1 / self.interval if self.interval else 0
+        return 0
+
+    def release(self):
+        self.opened = False
+
+
+_synthetic_frames = {}
+
+
+def open_camera(source=None):
+    source = CAMERA_SOURCE if source is None else source
+    if source.startswith('synthetic'):
+        directory = source.partition(':')[2]
+        if directory not in _synthetic_frames:
+            _synthetic_frames[directory] = load_frames(directory) if directory else None
+        return SyntheticCamera(_synthetic_frames[directory])
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
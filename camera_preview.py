@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import cv2
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from metrics import timed
+
+# Webcam preview for the Face ID loops. The capture/inference loop only hands
+# frames over; at most PREVIEW_MAX_FPS of them are kept, and only the newest
+# (anything not yet encoded is replaced, never queued). A background thread,
+# attached to the session's script run context so it can update the page,
+# downscales to PREVIEW_WIDTH and sends a JPEG at PREVIEW_JPEG_QUALITY, which
+# Streamlit forwards as-is instead of re-encoding full-resolution frames.
+PREVIEW_MAX_FPS = float(os.getenv('PREVIEW_MAX_FPS', '8'))
+PREVIEW_WIDTH = int(os.getenv('PREVIEW_WIDTH', '480'))
+PREVIEW_JPEG_QUALITY = int(os.getenv('PREVIEW_JPEG_QUALITY', '70'))
+
+
+# Downscaled JPEG bytes for a BGR frame
+def encode_preview(frame, width=PREVIEW_WIDTH, quality=PREVIEW_JPEG_QUALITY):
+    height, frame_width = frame.shape[:2]
+    if width and frame_width > width:
+        frame = cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes() if ok else None
+
+
+class CameraPreview:
+    def __init__(self, placeholder, max_fps=PREVIEW_MAX_FPS, width=PREVIEW_WIDTH, quality=PREVIEW_JPEG_QUALITY):
+        self.placeholder = placeholder
+        self.interval = 1 / max_fps if max_fps > 0 else 0
+        self.width = width
+        self.quality = quality
+        self.next_due = 0.0
+        self.latest = None
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='camera-preview', daemon=True)
+        add_script_run_ctx(self.thread, get_script_run_ctx())
+        self.thread.start()
+
+    # Called from the inference loop; never blocks on encoding
+    def submit(self, frame):
+        now = time.monotonic()
+        if now < self.next_due:
+            return
+        self.next_due = now + self.interval
+        with self.condition:
+            self.latest = frame
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.latest is not None or self.stopped)
+                if self.stopped:
+                    return
+                frame, self.latest = self.latest, None
+            try:
+                with timed('preview_encode'):
+                    data = encode_preview(frame, self.width, self.quality)
+                if data is not None:
+                    self.placeholder.image(data, output_format='JPEG', use_container_width=True)
+            except Exception:
+                # The session may have ended mid-update; the preview is best effort
+                pass
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join(timeout=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -2,16 +2,45 @@ import sqlite3
 import bcrypt
 import numpy as np
 import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from metrics import timed
+from write_behind import WriteBehindQueue, install
+
+# Plan ids are handed out in blocks reserved through id_blocks, so
+# save_workout_plan can return an id before its row is written
+WRITE_ID_BLOCK = int(os.getenv('WRITE_ID_BLOCK', '50'))
+
+# Random bytes in a plan's share link token
+SHARE_TOKEN_BYTES = 16
+
+# Database location (overridable for benchmarks and fixtures)
+DB_PATH = os.getenv('DB_PATH', 'users.db')
+
+# Archived plan JSON is zlib-compressed; inflate() lets queries read it like plain text
+def _inflate(data):
+    return zlib.decompress(data).decode() if data is not None else None
 
 # Database connection
 def get_db_connection():
-    conn = sqlite3.connect('users.db', check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.create_function('inflate', 1, _inflate, deterministic=True)
     return conn
 
 # Initialize the database and migrate passwords
 def init_db():
     conn = get_db_connection()
+    # New databases can hand freed pages back in small steps (maintenance.py retention);
+    # this is a no-op for databases that already have tables
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    # Serialize schema creation and migrations between workers starting together
+    conn.execute('BEGIN IMMEDIATE')
     conn.execute(''' 
         CREATE TABLE IF NOT EXISTS users ( 
             id INTEGER PRIMARY KEY AUTOINCREMENT, 
@@ -26,6 +55,7 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             embedding BLOB NOT NULL,
+            model_name TEXT NOT NULL DEFAULT 'Facenet',
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
@@ -39,6 +69,37 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS plan_contents (
+            hash TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS plan_archive (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mood_results (
+            user_id INTEGER PRIMARY KEY,
+            moods TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            frames INTEGER NOT NULL,
+            probabilities TEXT,
+            scanned_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS id_blocks (
+            name TEXT PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        )
+    ''')
     conn.execute('''
         CREATE TABLE IF NOT EXISTS progress (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,6 +112,21 @@ def init_db():
             FOREIGN KEY (plan_id) REFERENCES workout_plans (id)
         )
     ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress_summaries (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            entries INTEGER NOT NULL,
+            completed INTEGER NOT NULL,
+            with_feedback INTEGER NOT NULL,
+            first_at TIMESTAMP,
+            last_at TIMESTAMP,
+            affinities TEXT,
+            completed_days TEXT,
+            PRIMARY KEY (user_id, month),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
     
     migration_needed = conn.execute("PRAGMA table_info(users)").fetchall()
     if not any(col[1] == 'hash_method' for col in migration_needed):
@@ -62,19 +138,44 @@ def init_db():
                 conn.execute("UPDATE users SET password = ?, hash_method = 'bcrypt' WHERE id = ?",
                             (new_hash, user['id']))
         conn.commit()
+
+    # Tag embeddings with the model that produced them (older rows are Facenet)
+    embedding_columns = conn.execute("PRAGMA table_info(face_embeddings)").fetchall()
+    if not any(col[1] == 'model_name' for col in embedding_columns):
+        conn.execute("ALTER TABLE face_embeddings ADD COLUMN model_name TEXT NOT NULL DEFAULT 'Facenet'")
+
+    # Plans reference their content by hash; rows written before this keep their data inline
+    plan_columns = conn.execute("PRAGMA table_info(workout_plans)").fetchall()
+    if not any(col[1] == 'content_hash' for col in plan_columns):
+        conn.execute("ALTER TABLE workout_plans ADD COLUMN content_hash TEXT REFERENCES plan_contents (hash)")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_workout_plans_content_hash ON workout_plans (content_hash)')
+
+    # Plans are private until their owner shares them; shared plans are served by this token
+    plan_columns = conn.execute("PRAGMA table_info(workout_plans)").fetchall()
+    if not any(col[1] == 'share_token' for col in plan_columns):
+        conn.execute("ALTER TABLE workout_plans ADD COLUMN share_token TEXT")
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_workout_plans_share_token ON workout_plans (share_token)')
+
+    # Summaries keep what ranking (per-exercise affinity) and the streak (completion days) need
+    summary_columns = {col[1] for col in conn.execute("PRAGMA table_info(progress_summaries)").fetchall()}
+    for column in ('affinities', 'completed_days'):
+        if column not in summary_columns:
+            conn.execute(f"ALTER TABLE progress_summaries ADD COLUMN {column} TEXT")
     
     conn.commit()
     conn.close()
 
 # Hash passwords
 def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    with timed('bcrypt_hash'):
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
 # Verify password (support both bcrypt and SHA-256 during migration)
 def verify_password(password, hashed, hash_method='bcrypt'):
     if hash_method == 'bcrypt':
         try:
-            return bcrypt.checkpw(password.encode(), hashed.encode())
+            with timed('bcrypt_verify'):
+                return bcrypt.checkpw(password.encode(), hashed.encode())
         except ValueError:
             return False
     elif hash_method == 'sha256':
@@ -86,9 +187,10 @@ def create_user(username, email, password):
     conn = get_db_connection()
     hashed_password = hash_password(password)
     try:
-        conn.execute('INSERT INTO users (username, email, password, hash_method) VALUES (?, ?, ?, ?)', 
-                    (username, email, hashed_password, 'bcrypt'))
-        conn.commit()
+        with timed('sqlite_create_user'):
+            conn.execute('INSERT INTO users (username, email, password, hash_method) VALUES (?, ?, ?, ?)', 
+                        (username, email, hashed_password, 'bcrypt'))
+            conn.commit()
         return True
     except sqlite3.IntegrityError:
         if conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone():
@@ -101,61 +203,364 @@ def create_user(username, email, password):
 
 # Authenticate a user
 def authenticate(username, password):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    conn.close()
+    with timed('sqlite_authenticate'):
+        conn = get_db_connection()
+        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        conn.close()
     if user and verify_password(password, user['password'], user['hash_method']):
         return user
     return None
 
 # Save face embedding
-def save_face_embedding(user_id, embedding):
-    conn = get_db_connection()
-    embedding_array = np.array(embedding)
-    conn.execute(
-        "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
-        (user_id, embedding_array.tobytes())
-    )
-    conn.commit()
-    conn.close()
+def save_face_embedding(user_id, embedding, model_name='Facenet'):
+    embedding_array = np.array(embedding, dtype=np.float64)
+    with timed('sqlite_save_face_embedding'):
+        conn = get_db_connection()
+        conn.execute(
+            "INSERT INTO face_embeddings (user_id, embedding, model_name) VALUES (?, ?, ?)",
+            (user_id, embedding_array.tobytes(), model_name)
+        )
+        conn.commit()
+        conn.close()
 
-# Retrieve face embedding
-def get_face_embedding(user_id):
-    conn = get_db_connection()
-    embedding = conn.execute('SELECT embedding FROM face_embeddings WHERE user_id = ?', (user_id,)).fetchone()
-    conn.close()
+# Retrieve face embedding produced by a given model
+def get_face_embedding(user_id, model_name='Facenet'):
+    with timed('sqlite_get_face_embedding'):
+        conn = get_db_connection()
+        embedding = conn.execute('SELECT embedding FROM face_embeddings WHERE user_id = ? AND model_name = ? ORDER BY id DESC',
+                                 (user_id, model_name)).fetchone()
+        conn.close()
     return np.frombuffer(embedding["embedding"], dtype=np.float64) if embedding else None
 
-# Save workout plan
-def save_workout_plan(user_id, plan_type, workouts):
+# Retrieve a user's face embeddings from every model, preferring the given one
+def get_face_embeddings(user_id, preferred_model='Facenet'):
+    with timed('sqlite_get_face_embeddings'):
+        conn = get_db_connection()
+        rows = conn.execute('SELECT model_name, embedding FROM face_embeddings WHERE user_id = ? '
+                            'ORDER BY model_name = ? DESC, id DESC', (user_id, preferred_model)).fetchall()
+        conn.close()
+    return [(row['model_name'], np.frombuffer(row['embedding'], dtype=np.float64)) for row in rows]
+
+# Canonical JSON for a plan, so identical plans hash identically
+def normalize_plan_json(data):
+    return json.dumps(json.loads(data), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+def plan_content_hash(data):
+    return hashlib.sha256(data.encode()).hexdigest()
+
+# Inserts of plans and progress go through the write-behind queue
+_writer = install(WriteBehindQueue(get_db_connection))
+_id_lock = threading.Lock()
+_id_block = [0, 0]
+
+def _reset_id_block():
+    global _id_lock
+    _id_lock = threading.Lock()
+    _id_block[:] = [0, 0]
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_id_block)
+
+# Reserve `count` ids of a table for this process; never below ids already used
+def _reserve_ids(table, count):
     conn = get_db_connection()
-    plan_id = conn.execute('INSERT INTO workout_plans (user_id, type, data) VALUES (?, ?, ?)', 
-                          (user_id, plan_type, workouts.to_json())).lastrowid
-    conn.commit()
-    conn.close()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT next_id FROM id_blocks WHERE name = ?', (table,)).fetchone()
+        used = conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+        start = max(row['next_id'] if row else 0, used)
+        conn.execute('INSERT OR REPLACE INTO id_blocks (name, next_id) VALUES (?, ?)', (table, start + count))
+        conn.commit()
+    finally:
+        conn.close()
+    return start, start + count
+
+def _next_plan_id():
+    with _id_lock:
+        if _id_block[0] >= _id_block[1]:
+            _id_block[:] = _reserve_ids('workout_plans', WRITE_ID_BLOCK)
+        plan_id = _id_block[0]
+        _id_block[0] += 1
     return plan_id
 
+# Commit everything queued so far (reads call this so they see their own writes)
+def flush_writes(timeout=None):
+    return _writer.flush(timeout)
+
+def _insert_workout_plan(conn, plan_id, user_id, plan_type, content_hash, data):
+    conn.execute('INSERT OR IGNORE INTO plan_contents (hash, data) VALUES (?, ?)', (content_hash, data))
+    conn.execute("INSERT INTO workout_plans (id, user_id, type, data, content_hash) VALUES (?, ?, ?, '', ?)",
+                 (plan_id, user_id, plan_type, content_hash))
+
+# Save workout plan (content stored once in plan_contents, keyed by its hash)
+def save_workout_plan(user_id, plan_type, workouts):
+    data = normalize_plan_json(workouts.reset_index(drop=True).to_json())
+    content_hash = plan_content_hash(data)
+    with timed('sqlite_save_workout_plan'):
+        plan_id = _next_plan_id()
+        _writer.submit(_insert_workout_plan, plan_id, user_id, plan_type, content_hash, data)
+    return plan_id
+
+# Share a user's plan: returns its share link token (created on the first share),
+# or None if the user has no such plan
+def share_workout_plan(user_id, plan_id):
+    flush_writes()
+    with timed('sqlite_share_workout_plan'):
+        conn = get_db_connection()
+        with conn:
+            conn.execute('UPDATE workout_plans SET share_token = COALESCE(share_token, ?) WHERE id = ? AND user_id = ?',
+                         (secrets.token_urlsafe(SHARE_TOKEN_BYTES), plan_id, user_id))
+            row = conn.execute('SELECT share_token FROM workout_plans WHERE id = ? AND user_id = ?',
+                               (plan_id, user_id)).fetchone()
+        conn.close()
+    return row['share_token'] if row else None
+
+# Stop sharing a user's plan; its old link returns 404 from then on
+def unshare_workout_plan(user_id, plan_id):
+    flush_writes()
+    with timed('sqlite_unshare_workout_plan'):
+        conn = get_db_connection()
+        with conn:
+            conn.execute('UPDATE workout_plans SET share_token = NULL WHERE id = ? AND user_id = ?', (plan_id, user_id))
+        conn.close()
+
+# Plan JSON for a workout_plans row w: from plan_contents, the compressed
+# plan_archive, or inline for legacy rows
+PLAN_DATA_JOIN = '''
+    LEFT JOIN plan_contents c ON c.hash = w.content_hash
+    LEFT JOIN plan_archive a ON a.hash = w.content_hash AND c.hash IS NULL
+'''
+PLAN_DATA = 'COALESCE(c.data, inflate(a.data), w.data)'
+
+# Plan rows with their data resolved
+PLAN_SELECT = f'''
+    SELECT w.id, w.user_id, w.type, w.created_at, w.content_hash, {PLAN_DATA} AS data
+    FROM workout_plans w {PLAN_DATA_JOIN}
+'''
+
 # Get workout plans
 def get_workout_plans(user_id):
-    conn = get_db_connection()
-    plans = conn.execute('SELECT * FROM workout_plans WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
-    conn.close()
+    flush_writes()
+    with timed('sqlite_get_workout_plans'):
+        conn = get_db_connection()
+        plans = conn.execute(PLAN_SELECT + ' WHERE w.user_id = ? ORDER BY w.created_at DESC', (user_id,)).fetchall()
+        conn.close()
     return plans
 
-# Save progress
-def save_progress(user_id, plan_id, completed, feedback):
+# Move inline plan JSON into plan_contents, deduplicating identical plans.
+# Returns a report of rows migrated and bytes of plan JSON before/after.
+def dedupe_workout_plans(batch_size=500):
+    flush_writes()
     conn = get_db_connection()
+    report = {'rows_migrated': 0, 'new_contents': 0, 'inline_bytes_before': 0, 'content_bytes_added': 0}
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    report['file_bytes_before'] = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+    try:
+        while True:
+            rows = conn.execute("SELECT id, data FROM workout_plans WHERE content_hash IS NULL LIMIT ?",
+                                (batch_size,)).fetchall()
+            if not rows:
+                break
+            # One short transaction per batch keeps the write lock brief
+            with conn:
+                for row in rows:
+                    try:
+                        data = normalize_plan_json(row['data'])
+                    except ValueError:
+                        data = row['data']
+                    content_hash = plan_content_hash(data)
+                    inserted = conn.execute('INSERT OR IGNORE INTO plan_contents (hash, data) VALUES (?, ?)',
+                                            (content_hash, data)).rowcount
+                    conn.execute("UPDATE workout_plans SET content_hash = ?, data = '' WHERE id = ?",
+                                 (content_hash, row['id']))
+                    report['rows_migrated'] += 1
+                    report['new_contents'] += inserted
+                    report['inline_bytes_before'] += len(row['data'].encode())
+                    report['content_bytes_added'] += len(data.encode()) if inserted else 0
+        report['bytes_saved'] = report['inline_bytes_before'] - report['content_bytes_added']
+        report['free_bytes_after'] = conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size
+    finally:
+        conn.close()
+    return report
+
+# Roll progress rows older than `cutoff` ('YYYY-MM-DD HH:MM:SS', UTC) into
+# per-user monthly progress_summaries and delete them, batch by batch. Each
+# summary keeps the per-exercise ranking affinity of its rows and the days
+# with a completed workout, so personalization and streaks survive.
+def summarize_old_progress(cutoff, batch_size=500):
+    from ranking import plan_exercise_names, progress_weight
+    flush_writes()
+    conn = get_db_connection()
+    report = {'rows_summarized': 0, 'months_touched': 0}
+    last_id = 0
+    try:
+        while True:
+            # Summary and delete commit together, so a rerun never counts a row twice
+            conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                rows = conn.execute(f'''
+                    SELECT p.id, p.user_id, p.completed, p.feedback, p.completed_at, {PLAN_DATA} AS data
+                    FROM progress p LEFT JOIN workout_plans w ON w.id = p.plan_id {PLAN_DATA_JOIN}
+                    WHERE p.id > ? AND p.completed_at < ? ORDER BY p.id LIMIT ?
+                ''', (last_id, cutoff, batch_size)).fetchall()
+                if not rows:
+                    break
+                months = {}
+                for row in rows:
+                    key = (row['user_id'], row['completed_at'][:7])
+                    summary = months.get(key)
+                    if summary is None:
+                        existing = conn.execute('SELECT * FROM progress_summaries WHERE user_id = ? AND month = ?',
+                                                key).fetchone()
+                        summary = months[key] = {
+                            'entries': existing['entries'] if existing else 0,
+                            'completed': existing['completed'] if existing else 0,
+                            'with_feedback': existing['with_feedback'] if existing else 0,
+                            'first_at': existing['first_at'] if existing else row['completed_at'],
+                            'last_at': existing['last_at'] if existing else row['completed_at'],
+                            'affinities': json.loads(existing['affinities'] or '{}') if existing else {},
+                            'completed_days': set(json.loads(existing['completed_days'] or '[]') if existing else []),
+                        }
+                    summary['entries'] += 1
+                    summary['completed'] += 1 if row['completed'] else 0
+                    summary['with_feedback'] += 1 if row['feedback'] else 0
+                    summary['first_at'] = min(summary['first_at'], row['completed_at'])
+                    summary['last_at'] = max(summary['last_at'], row['completed_at'])
+                    if row['completed']:
+                        summary['completed_days'].add(row['completed_at'][:10])
+                    # Same per-exercise sums ranking.build_engine derives from raw rows
+                    weight = progress_weight(row['completed'], row['feedback'])
+                    for name in plan_exercise_names(row['data']) if row['data'] is not None else ():
+                        summary['affinities'][name] = summary['affinities'].get(name, 0.0) + weight
+                for (user_id, month), summary in months.items():
+                    conn.execute('INSERT OR REPLACE INTO progress_summaries (user_id, month, entries, completed, '
+                                 'with_feedback, first_at, last_at, affinities, completed_days) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (user_id, month, summary['entries'], summary['completed'], summary['with_feedback'],
+                                  summary['first_at'], summary['last_at'], json.dumps(summary['affinities']),
+                                  json.dumps(sorted(summary['completed_days']))))
+                report['months_touched'] += len(months)
+                report['rows_summarized'] += conn.execute(
+                    'DELETE FROM progress WHERE id > ? AND id <= ? AND completed_at < ?',
+                    (last_id, rows[-1]['id'], cutoff)).rowcount
+                last_id = rows[-1]['id']
+    finally:
+        conn.close()
+    return report
+
+# Move the content of plans created before `cutoff` from plan_contents into the
+# zlib-compressed plan_archive. Content still used by a newer plan stays put;
+# archived plans keep resolving through PLAN_SELECT.
+def archive_old_plans(cutoff, batch_size=500):
+    flush_writes()
+    conn = get_db_connection()
+    report = {'plans_scanned': 0, 'contents_archived': 0, 'json_bytes': 0, 'archived_bytes': 0}
+    last_id = 0
+    try:
+        while True:
+            rows = conn.execute('SELECT id, content_hash FROM workout_plans WHERE id > ? AND created_at < ? '
+                                'AND content_hash IS NOT NULL ORDER BY id LIMIT ?',
+                                (last_id, cutoff, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            report['plans_scanned'] += len(rows)
+            conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                for content_hash in {row['content_hash'] for row in rows}:
+                    content = conn.execute('SELECT data FROM plan_contents WHERE hash = ?', (content_hash,)).fetchone()
+                    if content is None:
+                        continue
+                    if conn.execute('SELECT 1 FROM workout_plans WHERE content_hash = ? AND created_at >= ? LIMIT 1',
+                                    (content_hash, cutoff)).fetchone():
+                        continue
+                    data = content['data'].encode()
+                    compressed = zlib.compress(data, 9)
+                    conn.execute('INSERT OR REPLACE INTO plan_archive (hash, data) VALUES (?, ?)',
+                                 (content_hash, compressed))
+                    conn.execute('DELETE FROM plan_contents WHERE hash = ?', (content_hash,))
+                    report['contents_archived'] += 1
+                    report['json_bytes'] += len(data)
+                    report['archived_bytes'] += len(compressed)
+    finally:
+        conn.close()
+    return report
+
+def _insert_progress(conn, user_id, plan_id, completed, feedback):
     conn.execute('INSERT INTO progress (user_id, plan_id, completed, feedback) VALUES (?, ?, ?, ?)', 
-                (user_id, plan_id, completed, feedback))
-    conn.commit()
-    conn.close()
+                 (user_id, plan_id, completed, feedback))
+
+# Save progress (queued behind the plan it refers to) and fold it into the
+# ranking engine; pass the plan's exercise names if they are at hand
+def save_progress(user_id, plan_id, completed, feedback, exercise_names=None):
+    import ranking
+    with timed('sqlite_save_progress'):
+        _writer.submit(_insert_progress, user_id, plan_id, completed, feedback)
+    ranking.record_progress(user_id, plan_id, completed, feedback, exercise_names)
+
+def _upsert_mood_result(conn, user_id, moods, confidence, frames, probabilities, scanned_at):
+    conn.execute('INSERT OR REPLACE INTO mood_results (user_id, moods, confidence, frames, probabilities, scanned_at) '
+                 'VALUES (?, ?, ?, ?, ?, ?)',
+                 (user_id, json.dumps(moods), confidence, frames, json.dumps(probabilities), scanned_at))
+
+# Remember a user's latest emotion scan
+def save_mood_result(user_id, moods, confidence, frames, probabilities=None):
+    with timed('sqlite_save_mood_result'):
+        _writer.submit(_upsert_mood_result, user_id, list(moods), float(confidence), int(frames),
+                       probabilities or {}, time.time())
+
+# Latest emotion scan of a user if it is at most max_age seconds old, else None
+def get_mood_result(user_id, max_age):
+    flush_writes()
+    with timed('sqlite_get_mood_result'):
+        conn = get_db_connection()
+        row = conn.execute('SELECT * FROM mood_results WHERE user_id = ? AND scanned_at >= ?',
+                           (user_id, time.time() - max_age)).fetchone()
+        conn.close()
+    if row is None:
+        return None
+    return {
+        'moods': json.loads(row['moods']),
+        'confidence': row['confidence'],
+        'frames': row['frames'],
+        'probabilities': json.loads(row['probabilities'] or '{}'),
+        'scanned_at': row['scanned_at'],
+    }
 
 # Get progress
 def get_progress(user_id):
-    conn = get_db_connection()
-    progress = conn.execute('SELECT * FROM progress WHERE user_id = ? ORDER BY completed_at DESC', (user_id,)).fetchall()
-    conn.close()
+    flush_writes()
+    with timed('sqlite_get_progress'):
+        conn = get_db_connection()
+        progress = conn.execute('SELECT * FROM progress WHERE user_id = ? ORDER BY completed_at DESC', (user_id,)).fetchall()
+        conn.close()
     return progress
 
+# Monthly totals of a user's progress rolled up by maintenance.py retention
+def get_progress_summaries(user_id):
+    with timed('sqlite_get_progress_summaries'):
+        conn = get_db_connection()
+        summaries = conn.execute('SELECT * FROM progress_summaries WHERE user_id = ? ORDER BY month DESC',
+                                 (user_id,)).fetchall()
+        conn.close()
+    return summaries
+
+# Workouts completed and the current streak, from a user's progress rows and
+# retention summaries. The streak counts consecutive days with a completed
+# workout, ending on the latest day with any progress (0 if nothing was
+# completed that day); summaries keep both, so retention does not change it.
+def progress_stats(progress, summaries):
+    completed = sum(1 for p in progress if p['completed']) + sum(s['completed'] for s in summaries)
+    completed_days = {day for s in summaries for day in json.loads(s['completed_days'] or '[]')}
+    completed_days.update(p['completed_at'][:10] for p in progress if p['completed'])
+    active_days = [p['completed_at'][:10] for p in progress] + [s['last_at'][:10] for s in summaries if s['last_at']]
+    streak = 0
+    if active_days:
+        day = date.fromisoformat(max(active_days))
+        while day.isoformat() in completed_days:
+            streak += 1
+            day -= timedelta(days=1)
+    return completed, streak
+
 # Initialize database
 init_db()
\ No newline at end of file
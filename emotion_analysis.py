@@ -0,0 +1,127 @@
+import csv
+import logging
+import os
+import numpy as np
+
+# Emotion classes DeepFace.analyze reports
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+# Emotion -> catalog mood blend weights (Emotion,Mood,Weight rows)
+EMOTION_MOOD_MAP_PATH = os.getenv('EMOTION_MOOD_MAP', 'emotion_mood_map.csv')
+
+# Scan tuning: EMA weight of the newest frame, the lead the top mood needs over
+# the runner-up before a scan may stop, the minimum/maximum frames per scan and
+# the smoothed share a secondary mood needs to be reported.
+EMOTION_EMA_ALPHA = float(os.getenv('EMOTION_EMA_ALPHA', '0.5'))
+EMOTION_CONFIDENCE_MARGIN = float(os.getenv('EMOTION_CONFIDENCE_MARGIN', '0.3'))
+EMOTION_MIN_FRAMES = int(os.getenv('EMOTION_MIN_FRAMES', '2'))
+EMOTION_MAX_FRAMES = int(os.getenv('EMOTION_MAX_FRAMES', '10'))
+EMOTION_MIN_SHARE = float(os.getenv('EMOTION_MIN_SHARE', '0.2'))
+
+logger = logging.getLogger(__name__)
+
+
+# Load the mapping as (moods, weights) where weights[i, j] is the share of
+# EMOTIONS[i] credited to moods[j]; each emotion's weights are normalized to 1
+def load_mood_map(path=EMOTION_MOOD_MAP_PATH):
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [row for row in csv.DictReader(f) if row.get('Emotion')]
+    except FileNotFoundError:
+        logger.warning("Emotion mood map %s not found; using the four base moods", path)
+        rows = [{'Emotion': e, 'Mood': e.capitalize(), 'Weight': 1} for e in ['happy', 'sad', 'angry', 'neutral']]
+    moods = list(dict.fromkeys(row['Mood'].strip() for row in rows))
+    weights = np.zeros((len(EMOTIONS), len(moods)))
+    for row in rows:
+        emotion = row['Emotion'].strip().lower()
+        if emotion not in EMOTIONS:
+            logger.warning("Ignoring unknown emotion %r in %s", emotion, path)
+            continue
+        weights[EMOTIONS.index(emotion), moods.index(row['Mood'].strip())] += float(row['Weight'])
+    totals = weights.sum(axis=1, keepdims=True)
+    np.divide(weights, totals, out=weights, where=totals > 0)
+    return moods, weights
+
+
+# Catalog moods and the emotion -> mood weight matrix
+MOODS, MOOD_WEIGHTS = load_mood_map()
+
+
+# Mood blend for a single dominant-emotion label
+def mood_scores(emotion):
+    emotion = emotion.lower()
+    if emotion not in EMOTIONS:
+        return {}
+    row = MOOD_WEIGHTS[EMOTIONS.index(emotion)]
+    return {mood: float(w) for mood, w in zip(MOODS, row) if w > 0}
+
+
+# Exponential moving average of per-frame mood probabilities with early stopping
+class EmotionAccumulator:
+    def __init__(self, alpha=EMOTION_EMA_ALPHA, margin=EMOTION_CONFIDENCE_MARGIN,
+                 min_frames=EMOTION_MIN_FRAMES, max_frames=EMOTION_MAX_FRAMES, min_share=EMOTION_MIN_SHARE):
+        self.alpha = alpha
+        self.margin = margin
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.min_share = min_share
+        self.smoothed = None
+        self.frames = 0
+
+    # Emotion probability vector from DeepFace's per-emotion scores (percentages)
+    def _emotion_vector(self, emotion_scores):
+        scores = {k.lower(): float(v) for k, v in emotion_scores.items()}
+        vector = np.array([scores.get(emotion, 0.0) for emotion in EMOTIONS])
+        total = vector.sum()
+        return vector / total if total > 0 else None
+
+    # Fold one frame's DeepFace 'emotion' dict into the average; False if it carried no signal
+    def add(self, emotion_scores):
+        vector = self._emotion_vector(emotion_scores)
+        if vector is None:
+            return False
+        if self.smoothed is None:
+            self.smoothed = vector
+        else:
+            self.smoothed = self.alpha * vector + (1 - self.alpha) * self.smoothed
+        self.frames += 1
+        return True
+
+    # Lead of the top emotion over the runner-up, in [0, 1]. Measured on emotions
+    # rather than moods so that blended mappings (fear -> Fear + Neutral) can still stop early.
+    def confidence(self):
+        if self.smoothed is None:
+            return 0.0
+        top, runner_up = np.sort(self.smoothed)[::-1][:2]
+        return float(top - runner_up)
+
+    def is_confident(self):
+        return self.frames >= self.min_frames and self.confidence() >= self.margin
+
+    def done(self):
+        return self.frames >= self.max_frames or self.is_confident()
+
+    # Smoothed probability per catalog mood; every emotion contributes through the mood map
+    def probabilities(self):
+        if self.smoothed is None:
+            return {}
+        return {mood: float(p) for mood, p in zip(MOODS, self.smoothed @ MOOD_WEIGHTS)}
+
+    # Equal-weight combination of several people's accumulators (class-wide mood)
+    @classmethod
+    def combine(cls, accumulators):
+        combined = cls()
+        vectors = [a.smoothed for a in accumulators if a.smoothed is not None]
+        if vectors:
+            combined.smoothed = np.mean(vectors, axis=0)
+            combined.frames = sum(a.frames for a in accumulators)
+        return combined
+
+    # Up to `limit` moods, strongest first: the top mood plus any with a meaningful share
+    def top_moods(self, limit=3):
+        if self.smoothed is None:
+            return []
+        moods = self.smoothed @ MOOD_WEIGHTS
+        order = np.argsort(moods)[::-1]
+        return [MOODS[i] for rank, i in enumerate(order[:limit])
+                if rank == 0 or moods[i] >= self.min_share]
@@ -0,0 +1,175 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import statistics
+import sys
+import time
+
+import cv2
+
+from face_models import FACE_MODEL, MODEL_THRESHOLDS, model_settings, distance
+
+# Enrollment/verification latency, memory footprint and verification accuracy
+# of each supported face model on a local dataset laid out as
+# <dataset>/<person>/<image>. The first image per person is enrolled; the rest
+# are genuine attempts and every other person's enrollment is an impostor pair.
+# Each model runs in a fresh process so its memory footprint is measured alone.
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_dataset(dataset_dir):
+    people = {}
+    for person in sorted(os.listdir(dataset_dir)):
+        folder = os.path.join(dataset_dir, person)
+        if not os.path.isdir(folder):
+            continue
+        images = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                  if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+        if len(images) >= 2:
+            people[person] = images
+    return people
+
+
+def _represent(backend, model_name, path):
+    frame = cv2.imread(path)
+    if frame is None:
+        return None
+    try:
+        result = backend.represent(frame, model_name=model_name, enforce_detection=True)
+    except Exception:
+        return None
+    return result[0]['embedding'] if result else None
+
+
+def _latency(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return {'median_ms': statistics.median(samples), 'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))]}
+
+
+# Runs inside a child process
+def benchmark_model(model_name, people):
+    from inference_backend import get_backend
+    backend = get_backend()
+    metric, threshold = model_settings(model_name)
+    rss_before = _rss_mb()
+    first_image = next(iter(people.values()))[0]
+    start = time.perf_counter()
+    _represent(backend, model_name, first_image)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    enrolled, enroll_ms = {}, []
+    for person, images in people.items():
+        start = time.perf_counter()
+        embedding = _represent(backend, model_name, images[0])
+        enroll_ms.append((time.perf_counter() - start) * 1000)
+        if embedding is not None:
+            enrolled[person] = embedding
+
+    verify_ms = []
+    genuine = impostor = true_accepts = false_accepts = 0
+    for person, images in people.items():
+        for path in images[1:]:
+            start = time.perf_counter()
+            embedding = _represent(backend, model_name, path)
+            if embedding is None:
+                continue
+            if person in enrolled:
+                accepted = distance(embedding, enrolled[person], metric) < threshold
+                verify_ms.append((time.perf_counter() - start) * 1000)
+                genuine += 1
+                true_accepts += accepted
+            for other, reference in enrolled.items():
+                if other != person:
+                    impostor += 1
+                    false_accepts += distance(embedding, reference, metric) < threshold
+
+    total = genuine + impostor
+    return {
+        'model': model_name,
+        'metric': metric,
+        'threshold': threshold,
+        'model_load_seconds': load_seconds,
+        'rss_model_mb': rss_loaded - rss_before,
+        'rss_peak_mb': _rss_mb(),
+        'enrolled': len(enrolled),
+        'enrollment': _latency(enroll_ms),
+        'verification': _latency(verify_ms),
+        'genuine_pairs': genuine,
+        'impostor_pairs': impostor,
+        'true_accept_rate': true_accepts / genuine if genuine else None,
+        'false_accept_rate': false_accepts / impostor if impostor else None,
+        'accuracy': (true_accepts + impostor - false_accepts) / total if total else None,
+    }
+
+
+def _run_in_child(model_name, people, queue):
+    try:
+        queue.put(benchmark_model(model_name, people))
+    except Exception as e:
+        queue.put({'model': model_name, 'error': str(e)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare DeepFace recognition models for Face ID.")
+    parser.add_argument('dataset', help="Directory with one sub-folder of face images per person")
+    parser.add_argument('--models', default=','.join(MODEL_THRESHOLDS),
+                        help="Comma-separated models (default: all supported)")
+    parser.add_argument('--timeout', type=float, default=3600, help="Seconds allowed per model")
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    people = load_dataset(args.dataset)
+    if len(people) < 2:
+        print("Need at least two people with two or more images each.", file=sys.stderr)
+        return 1
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for model_name in [m.strip() for m in args.models.split(',') if m.strip()]:
+        queue = context.Queue()
+        process = context.Process(target=_run_in_child, args=(model_name, people, queue))
+        process.start()
+        try:
+            result = queue.get(timeout=args.timeout)
+        except queue_module.Empty:
+            process.terminate()
+            result = {'model': model_name, 'error': f"no result within {args.timeout:.0f}s (exit code {process.exitcode})"}
+        process.join()
+        results.append(result)
+        if 'error' in result:
+            print(f"{model_name:13} failed: {result['error']}", file=sys.stderr)
+        else:
+            verification = result['verification'] or {}
+            accuracy = result['accuracy']
+            print(f"{model_name:13} verify {verification.get('median_ms', float('nan')):8.1f} ms  "
+                  f"rss +{result['rss_model_mb']:7.1f} MB  "
+                  f"accuracy {accuracy if accuracy is not None else float('nan'):.3f}", file=sys.stderr)
+
+    report = json.dumps({'dataset': args.dataset, 'people': len(people), 'configured_model': FACE_MODEL,
+                         'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
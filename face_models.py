@@ -0,0 +1,58 @@
+import os
+import numpy as np
+
+# Face ID recognition settings. FACE_MODEL picks the DeepFace model,
+# FACE_DISTANCE_METRIC and FACE_THRESHOLD override its defaults below.
+FACE_MODEL = os.getenv('FACE_MODEL', 'Facenet')
+FACE_DISTANCE_METRIC = os.getenv('FACE_DISTANCE_METRIC')
+FACE_THRESHOLD = os.getenv('FACE_THRESHOLD')
+
+METRICS = ('cosine', 'euclidean', 'euclidean_l2')
+
+# Verification thresholds per model and metric (DeepFace's published values;
+# Facenet/euclidean keeps the 10 this app has always used)
+MODEL_THRESHOLDS = {
+    'VGG-Face': {'cosine': 0.68, 'euclidean': 1.17, 'euclidean_l2': 1.17},
+    'Facenet': {'cosine': 0.40, 'euclidean': 10, 'euclidean_l2': 0.80},
+    'Facenet512': {'cosine': 0.30, 'euclidean': 23.56, 'euclidean_l2': 1.04},
+    'ArcFace': {'cosine': 0.68, 'euclidean': 4.15, 'euclidean_l2': 1.13},
+    'OpenFace': {'cosine': 0.10, 'euclidean': 0.55, 'euclidean_l2': 0.55},
+    'DeepFace': {'cosine': 0.23, 'euclidean': 64, 'euclidean_l2': 0.64},
+    'DeepID': {'cosine': 0.015, 'euclidean': 45, 'euclidean_l2': 0.17},
+    'Dlib': {'cosine': 0.07, 'euclidean': 0.6, 'euclidean_l2': 0.4},
+    'SFace': {'cosine': 0.593, 'euclidean': 10.734, 'euclidean_l2': 1.055},
+    'GhostFaceNet': {'cosine': 0.65, 'euclidean': 35.71, 'euclidean_l2': 1.10},
+}
+
+# Metric used when FACE_DISTANCE_METRIC is not set
+DEFAULT_METRICS = {'Facenet': 'euclidean'}
+
+
+# (metric, threshold) for a model, honoring the environment overrides for the configured model
+def model_settings(model_name=FACE_MODEL):
+    if model_name not in MODEL_THRESHOLDS:
+        raise ValueError(f"Unsupported face model {model_name!r}; choose from {sorted(MODEL_THRESHOLDS)}")
+    configured = model_name == FACE_MODEL
+    metric = (FACE_DISTANCE_METRIC if configured and FACE_DISTANCE_METRIC
+              else DEFAULT_METRICS.get(model_name, 'cosine'))
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported distance metric {metric!r}; choose from {METRICS}")
+    threshold = float(FACE_THRESHOLD) if configured and FACE_THRESHOLD else MODEL_THRESHOLDS[model_name][metric]
+    return metric, threshold
+
+
+def distance(a, b, metric):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if metric == 'cosine':
+        return 1 - float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+    if metric == 'euclidean_l2':
+        a = a / np.linalg.norm(a)
+        b = b / np.linalg.norm(b)
+    return float(np.linalg.norm(a - b))
+
+
+# Whether two embeddings from the same model belong to the same person
+def is_match(a, b, model_name=FACE_MODEL):
+    metric, threshold = model_settings(model_name)
+    return distance(a, b, metric) < threshold
@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+
+from emotion_analysis import EmotionAccumulator
+from face_models import FACE_MODEL, model_settings, distance
+from inference_backend import get_backend
+from metrics import timed
+
+# Group session mode: every emotion pass analyzes all faces in the frame.
+# Detections are linked across frames by box overlap (IoU), each tracked
+# person keeps their own EmotionAccumulator, and the class-wide mood is the
+# equal-weight combination of everybody's. Tracks can optionally be matched
+# once against the given enrolled embeddings; the app only passes the
+# logged-in user's own, so nobody else in the room is identified.
+GROUP_IOU_THRESHOLD = float(os.getenv('GROUP_IOU_THRESHOLD', '0.3'))
+GROUP_MAX_MISSED = int(os.getenv('GROUP_MAX_MISSED', '5'))
+GROUP_MIN_FRAMES = int(os.getenv('GROUP_MIN_FRAMES', '2'))
+GROUP_MAX_FRAMES = int(os.getenv('GROUP_MAX_FRAMES', '15'))
+
+# Context kept around a face box when cropping it for identity matching
+CROP_PADDING = 0.2
+
+
+def _box(region):
+    return (int(region.get('x', 0)), int(region.get('y', 0)), int(region.get('w', 0)), int(region.get('h', 0)))
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.accumulator = EmotionAccumulator()
+        self.missed = 0
+        self.user_id = None
+        self.match_tried = False
+
+    @property
+    def active(self):
+        return self.missed <= GROUP_MAX_MISSED
+
+    # Never the matched username: a face match alone does not confirm who someone is
+    @property
+    def label(self):
+        return f"Participant {self.track_id}"
+
+
+class GroupTracker:
+    def __init__(self, iou_threshold=GROUP_IOU_THRESHOLD):
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+
+    # Assign this frame's (box, emotion scores) detections to tracks; returns new tracks
+    def update(self, detections):
+        active = [track for track in self.tracks if track.active]
+        pairs = sorted(((iou(track.box, box), t, d) for t, track in enumerate(active)
+                        for d, (box, _) in enumerate(detections)), reverse=True)
+        matched_tracks, matched_detections = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            box, scores = detections[d]
+            active[t].box = box
+            active[t].missed = 0
+            active[t].accumulator.add(scores)
+        for t, track in enumerate(active):
+            if t not in matched_tracks:
+                track.missed += 1
+        new_tracks = []
+        for d, (box, scores) in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(len(self.tracks) + 1, box)
+                track.accumulator.add(scores)
+                self.tracks.append(track)
+                new_tracks.append(track)
+        return new_tracks
+
+    # Tracks seen often enough to be a person rather than a spurious detection
+    def people(self):
+        return [track for track in self.tracks if track.accumulator.frames >= GROUP_MIN_FRAMES]
+
+
+# Nearest enrolled user for a face embedding, within the model's threshold
+class EnrolledMatcher:
+    def __init__(self, enrolled, model_name=FACE_MODEL):
+        self.enrolled = enrolled
+        self.model_name = model_name
+        self.metric, self.threshold = model_settings(model_name)
+
+    def match(self, embedding, exclude=()):
+        best = None
+        for user_id, username, reference in self.enrolled:
+            if user_id in exclude:
+                continue
+            d = distance(embedding, reference, self.metric)
+            if d < self.threshold and (best is None or d < best[2]):
+                best = (user_id, username, d)
+        return best
+
+
+class GroupSession:
+    def __init__(self, enrolled=None, max_frames=GROUP_MAX_FRAMES):
+        self.tracker = GroupTracker()
+        self.matcher = EnrolledMatcher(enrolled) if enrolled else None
+        self.max_frames = max_frames
+        self.frames = 0
+        self.emotion_passes = 0
+        self.identity_passes = 0
+
+    # One emotion inference for every face in the frame
+    def process(self, frame):
+        self.frames += 1
+        self.emotion_passes += 1
+        try:
+            with timed('deepface_analyze_group'):
+                results = get_backend().analyze_emotion(frame, enforce_detection=True)
+        except Exception:
+            results = []
+        detections = [(_box(result.get('region', {})), result['emotion']) for result in results]
+        for track in self.tracker.update(detections):
+            self._identify(track, frame)
+
+    def _identify(self, track, frame):
+        if self.matcher is None or track.match_tried:
+            return
+        track.match_tried = True
+        x, y, w, h = track.box
+        pad_x, pad_y = int(w * CROP_PADDING), int(h * CROP_PADDING)
+        crop = frame[max(0, y - pad_y):y + h + pad_y, max(0, x - pad_x):x + w + pad_x]
+        if crop.size == 0:
+            return
+        self.identity_passes += 1
+        try:
+            with timed('deepface_represent'):
+                result = get_backend().represent(crop, model_name=self.matcher.model_name, enforce_detection=False)
+        except Exception:
+            return
+        if not result:
+            return
+        taken = {other.user_id for other in self.tracker.tracks if other.user_id is not None}
+        match = self.matcher.match(np.asarray(result[0]['embedding']), exclude=taken)
+        if match:
+            track.user_id = match[0]
+
+    # Finished once everybody in view has a confident mood, or after max_frames
+    def done(self):
+        if self.frames >= self.max_frames:
+            return True
+        people = [track for track in self.tracker.people() if track.active]
+        return bool(people) and all(track.accumulator.is_confident() for track in people)
+
+    def summary(self):
+        people = self.tracker.people()
+        return {
+            'frames': self.frames,
+            'emotion_passes': self.emotion_passes,
+            'identity_passes': self.identity_passes,
+            'class_moods': EmotionAccumulator.combine([p.accumulator for p in people]).top_moods(),
+            'people': [{
+                'label': person.label,
+                'user_id': person.user_id,
+                'moods': person.accumulator.top_moods(),
+                'frames': person.accumulator.frames,
+                'confidence': person.accumulator.confidence(),
+            } for person in people],
+        }
@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+from emotion_analysis import EMOTIONS
+
+# Pluggable CPU inference for the emotion and face-recognition models.
+# INFERENCE_BACKEND=deepface runs the stock Keras graphs through DeepFace;
+# INFERENCE_BACKEND=tflite runs reduced-precision exports of the same models
+# (see `python inference_backend.py export`) with INFERENCE_THREADS threads.
+# Face detection and alignment still go through DeepFace.extract_faces, and the
+# crops are letterboxed the way DeepFace does it, so both backends get the same
+# input tensors.
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'deepface')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', str(os.cpu_count() or 1)))
+TFLITE_MODEL_DIR = os.getenv('TFLITE_MODEL_DIR', 'models')
+TFLITE_PRECISION = os.getenv('TFLITE_PRECISION', 'float16')
+
+PRECISIONS = ('float16', 'int8')
+EMOTION_INPUT_SIZE = (48, 48)
+# DeepFace.analyze letterboxes each face to this size before the emotion model
+EMOTION_CROP_SIZE = (224, 224)
+
+
+# Stock DeepFace path: full-precision TensorFlow/Keras graphs
+class DeepFaceBackend:
+    name = 'deepface'
+
+    def represent(self, frame, model_name="Facenet", enforce_detection=True):
+        return DeepFace.represent(frame, model_name=model_name, enforce_detection=enforce_detection)
+
+    def analyze_emotion(self, frame, enforce_detection=True):
+        return DeepFace.analyze(frame, actions=['emotion'], enforce_detection=enforce_detection)
+
+
+def _load_interpreter(path, threads):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    interpreter = Interpreter(model_path=path, num_threads=threads)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+# Detected, aligned faces as DeepFace returns them: RGB floats in [0, 1]
+def _faces(frame, enforce_detection):
+    return DeepFace.extract_faces(frame, enforce_detection=enforce_detection, align=True)
+
+
+# DeepFace's preprocessing.resize_image: scale to fit target_size (height, width)
+# keeping the aspect ratio, pad the rest with black, pixels as float32 in [0, 1]
+def _resize_pad(img, target_size):
+    if img.shape[0] > 0 and img.shape[1] > 0:
+        factor = min(target_size[0] / img.shape[0], target_size[1] / img.shape[1])
+        img = cv2.resize(img, (int(img.shape[1] * factor), int(img.shape[0] * factor)))
+        pad_0 = target_size[0] - img.shape[0]
+        pad_1 = target_size[1] - img.shape[1]
+        padding = ((pad_0 // 2, pad_0 - pad_0 // 2), (pad_1 // 2, pad_1 - pad_1 // 2))
+        img = np.pad(img, padding + ((0, 0),) * (img.ndim - 2), 'constant')
+    if img.shape[:2] != tuple(target_size):
+        img = cv2.resize(img, (target_size[1], target_size[0]))
+    img = img.astype(np.float32)
+    if img.max() > 1:
+        img /= 255.0
+    return img
+
+
+# Recognition model input for a face, as DeepFace.represent builds it (BGR, letterboxed)
+def _recognition_input(face, size):
+    width, height = size
+    return _resize_pad(face['face'][:, :, ::-1], (height, width))
+
+
+# Emotion model input, as DeepFace.analyze builds it: the letterboxed BGR crop in
+# grayscale, resized to the model input
+def _emotion_input(face, size=EMOTION_INPUT_SIZE):
+    crop = _resize_pad(face['face'][:, :, ::-1], EMOTION_CROP_SIZE)
+    return cv2.resize(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), size)
+
+
+# One TFLite model; interpreters are not thread-safe, so calls are serialized
+class _TFLiteModel:
+    def __init__(self, path, threads):
+        self.interpreter = _load_interpreter(path, threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.lock = threading.Lock()
+
+    def input_size(self):
+        _, height, width = self.input['shape'][:3]
+        return int(width), int(height)
+
+    def __call__(self, batch):
+        batch = batch.astype(np.float32)
+        scale, zero_point = self.input.get('quantization', (0.0, 0))
+        if self.input['dtype'] in (np.int8, np.uint8) and scale:
+            batch = np.round(batch / scale + zero_point).astype(self.input['dtype'])
+        with self.lock:
+            self.interpreter.set_tensor(self.input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output['index'])
+        scale, zero_point = self.output.get('quantization', (0.0, 0))
+        if self.output['dtype'] in (np.int8, np.uint8) and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+# Reduced-precision TFLite path; models without an export fall back to DeepFace
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, model_dir=TFLITE_MODEL_DIR, precision=TFLITE_PRECISION, threads=INFERENCE_THREADS):
+        self.model_dir = model_dir
+        self.precision = precision
+        self.threads = threads
+        self.fallback = DeepFaceBackend()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, name):
+        with self._lock:
+            if name not in self._models:
+                path = model_path(name, self.precision, self.model_dir)
+                self._models[name] = _TFLiteModel(path, self.threads) if os.path.exists(path) else None
+            return self._models[name]
+
+    def represent(self, frame, model_name="Facenet", enforce_detection=True):
+        model = self._model(model_name)
+        if model is None:
+            return self.fallback.represent(frame, model_name=model_name, enforce_detection=enforce_detection)
+        results = []
+        for face in _faces(frame, enforce_detection):
+            crop = _recognition_input(face, model.input_size())
+            embedding = model(crop[np.newaxis])[0]
+            results.append({'embedding': embedding.astype(np.float64).tolist(),
+                            'facial_area': face['facial_area'],
+                            'face_confidence': face.get('confidence')})
+        return results
+
+    def analyze_emotion(self, frame, enforce_detection=True):
+        model = self._model('Emotion')
+        if model is None:
+            return self.fallback.analyze_emotion(frame, enforce_detection=enforce_detection)
+        results = []
+        for face in _faces(frame, enforce_detection):
+            gray = _emotion_input(face, model.input_size())
+            probabilities = model(gray[np.newaxis, :, :, np.newaxis])[0]
+            probabilities = probabilities / probabilities.sum() * 100
+            scores = {emotion: float(p) for emotion, p in zip(EMOTIONS, probabilities)}
+            results.append({'emotion': scores,
+                            'dominant_emotion': max(scores, key=scores.get),
+                            'region': face['facial_area'],
+                            'face_confidence': face.get('confidence')})
+        return results
+
+
+BACKENDS = {'deepface': DeepFaceBackend, 'tflite': TFLiteBackend}
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Process-wide backend selected by INFERENCE_BACKEND
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if INFERENCE_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown INFERENCE_BACKEND {INFERENCE_BACKEND!r}; choose from {sorted(BACKENDS)}")
+            _backend = BACKENDS[INFERENCE_BACKEND]()
+        return _backend
+
+
+def model_path(model_name, precision, model_dir=TFLITE_MODEL_DIR):
+    return os.path.join(model_dir, f"{model_name.lower()}_{precision}.tflite")
+
+
+# The Keras model behind a DeepFace model name
+def _keras_model(model_name):
+    try:
+        task = 'facial_attribute' if model_name == 'Emotion' else 'facial_recognition'
+        built = DeepFace.build_model(model_name, task=task)
+    except TypeError:
+        built = DeepFace.build_model(model_name)
+    return getattr(built, 'model', built)
+
+
+def _list_images(directory):
+    images = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        images.extend(os.path.join(root, f) for f in sorted(files)
+                      if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+    return images
+
+
+# Convert a DeepFace model to TFLite. int8 calibrates on the faces detected in
+# calibration_dir's images, preprocessed exactly as at inference time.
+def export_model(model_name, precision, model_dir=TFLITE_MODEL_DIR, calibration_dir=None):
+    import tensorflow as tf
+    model = _keras_model(model_name)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == 'int8' and calibration_dir:
+        _, height, width = model.input_shape[:3]
+        grayscale = model.input_shape[-1] == 1
+
+        def representative_dataset():
+            for path in _list_images(calibration_dir)[:200]:
+                image = cv2.imread(path)
+                if image is None:
+                    continue
+                try:
+                    faces = _faces(image, enforce_detection=True)
+                except ValueError:
+                    # No face found; skip rather than calibrate on the whole image
+                    continue
+                for face in faces:
+                    if grayscale:
+                        crop = _emotion_input(face, (width, height))
+                    else:
+                        crop = _recognition_input(face, (width, height))
+                    yield [crop.reshape((1, height, width, -1))]
+
+        converter.representative_dataset = representative_dataset
+    # Without calibration data int8 falls back to dynamic-range quantization (int8 weights)
+    os.makedirs(model_dir, exist_ok=True)
+    path = model_path(model_name, precision, model_dir)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    return path
+
+
+# Accuracy and latency of the TFLite exports against stock DeepFace on a local image set.
+# Images in sub-folders named after an emotion (happy/, sad/, ...) also score label accuracy.
+def compare(eval_dir, precision, model_dir, threads, recognition_model="Facenet"):
+    stock = DeepFaceBackend()
+    quantized = TFLiteBackend(model_dir=model_dir, precision=precision, threads=threads)
+    timings = {'deepface': {'emotion': [], 'represent': []}, 'tflite': {'emotion': [], 'represent': []}}
+    agreement, labelled, correct = [], 0, {'deepface': 0, 'tflite': 0}
+    similarities = []
+    images = _list_images(eval_dir)
+    for path in images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        label = os.path.basename(os.path.dirname(path)).lower()
+        try:
+            outputs = {}
+            for name, backend in (('deepface', stock), ('tflite', quantized)):
+                start = time.perf_counter()
+                emotion = backend.analyze_emotion(frame)
+                timings[name]['emotion'].append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                embedding = backend.represent(frame, model_name=recognition_model)
+                timings[name]['represent'].append((time.perf_counter() - start) * 1000)
+                outputs[name] = (emotion[0]['dominant_emotion'], np.array(embedding[0]['embedding']))
+        except Exception:
+            continue
+        agreement.append(outputs['deepface'][0] == outputs['tflite'][0])
+        if label in EMOTIONS:
+            labelled += 1
+            for name in correct:
+                correct[name] += outputs[name][0] == label
+        a, b = outputs['deepface'][1], outputs['tflite'][1]
+        similarities.append(float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b))))
+
+    def latency(samples):
+        return {'median_ms': statistics.median(samples), 'mean_ms': statistics.fmean(samples)} if samples else None
+
+    report = {
+        'eval_dir': eval_dir,
+        'precision': precision,
+        'threads': threads,
+        'images': len(images),
+        'faces_compared': len(agreement),
+        'emotion_agreement': sum(agreement) / len(agreement) if agreement else None,
+        'embedding_cosine_similarity_mean': statistics.fmean(similarities) if similarities else None,
+        'embedding_cosine_similarity_min': min(similarities) if similarities else None,
+        'label_accuracy': {name: correct[name] / labelled for name in correct} if labelled else None,
+        'latency': {name: {stage: latency(samples) for stage, samples in stages.items()}
+                    for name, stages in timings.items()},
+    }
+    for stage in ('emotion', 'represent'):
+        base, fast = report['latency']['deepface'][stage], report['latency']['tflite'][stage]
+        if base and fast:
+            report[f'{stage}_speedup'] = base['median_ms'] / fast['median_ms']
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and evaluate reduced-precision inference models.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Export DeepFace models to TFLite")
+    export.add_argument('--models', default='Emotion,Facenet', help="Comma-separated DeepFace model names")
+    export.add_argument('--precision', choices=PRECISIONS, default=TFLITE_PRECISION)
+    export.add_argument('--model-dir', default=TFLITE_MODEL_DIR)
+    export.add_argument('--calibration-dir', help="Face images for full-integer int8 calibration")
+    evaluate = sub.add_parser('compare', help="Compare TFLite exports with stock DeepFace")
+    evaluate.add_argument('eval_dir', help="Directory of evaluation images (optionally in emotion-named sub-folders)")
+    evaluate.add_argument('--precision', choices=PRECISIONS, default=TFLITE_PRECISION)
+    evaluate.add_argument('--model-dir', default=TFLITE_MODEL_DIR)
+    evaluate.add_argument('--threads', type=int, default=INFERENCE_THREADS)
+    evaluate.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        for model_name in [m.strip() for m in args.models.split(',') if m.strip()]:
+            path = export_model(model_name, args.precision, args.model_dir, args.calibration_dir)
+            print(f"Exported {model_name} to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        return 0
+
+    report = json.dumps(compare(args.eval_dir, args.precision, args.model_dir, args.threads), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
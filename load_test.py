@@ -0,0 +1,310 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import random
+import resource
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+# Load generator for one node. Simulated sessions run the login (password +
+# Face ID), emotion scan, duration plan, history and email flows end to end
+# through the app's own functions, with the webcam replaced by the synthetic
+# camera (CAMERA_SOURCE=synthetic), mail sent to a local SMTP sink and users
+# seeded into a temporary database. Sessions are threads spread over worker
+# processes, like Streamlit sessions inside server processes. For each
+# concurrency level the report gives throughput, p50/p95/p99 per flow and
+# CPU/RSS per worker. Runs offline; vision flows need the DeepFace weights
+# cached in ~/.deepface, and Face ID only matches with --frames-dir images
+# of a real face.
+
+FLOWS = ('login', 'scan', 'plan', 'history', 'email')
+PASSWORD = 'loadtest'
+SENDER = 'loadtest@example.com'
+
+
+# Minimal SMTP server that accepts and discards every message
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self._reply('220 localhost sink ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self._reply('250-localhost')
+                self._reply('250 AUTH PLAIN LOGIN')
+            elif command.startswith('DATA'):
+                self._reply('354 end data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply('250 OK')
+            elif command.startswith('AUTH'):
+                self._reply('235 accepted')
+            elif command.startswith('QUIT'):
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.messages = 0
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_users(n_users):
+    import database
+    from camera import open_camera
+    from face_models import FACE_MODEL
+    from inference_backend import get_backend
+
+    # Enroll everybody with the synthetic camera's first frame so Face ID can match
+    cap = open_camera()
+    _, frame = cap.read()
+    cap.release()
+    try:
+        embedding = get_backend().represent(frame, model_name=FACE_MODEL, enforce_detection=True)[0]['embedding']
+    except Exception as e:
+        print(f"Enrollment frame has no detectable face ({e}); login flows will time out", file=sys.stderr)
+        import numpy as np
+        embedding = np.random.default_rng(0).standard_normal(128)
+    password_hash = database.hash_password(PASSWORD)
+    conn = database.get_db_connection()
+    conn.executemany("INSERT INTO users (username, email, password, hash_method) VALUES (?, ?, ?, 'bcrypt')",
+                     ((f"load{i}", f"load{i}@example.com", password_hash) for i in range(n_users)))
+    conn.commit()
+    conn.close()
+    for user_id in range(1, n_users + 1):
+        database.save_face_embedding(user_id, embedding, model_name=FACE_MODEL)
+    # A little history per user so history and ranking have work to do
+    from workout_catalog import duration_catalog
+    catalog = duration_catalog()
+    for user_id in range(1, n_users + 1):
+        for _ in range(3):
+            database.save_workout_plan(user_id, 'duration', catalog.sample(6, random_state=user_id))
+    database.flush_writes()
+
+
+# One simulated user session; returns {flow: [seconds, ...]} and error counts
+def run_session(session_id, n_users, deadline, results, errors):
+    import auth
+    import plan_pool
+    import workout_recommendation as wr
+    from database import authenticate, get_workout_plans, save_workout_plan
+
+    rng = random.Random(session_id)
+
+    def timed_flow(name, fn):
+        start = time.perf_counter()
+        try:
+            ok = fn()
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok is False:
+            errors[name] = errors.get(name, 0) + 1
+        else:
+            results.setdefault(name, []).append(elapsed)
+
+    while time.monotonic() < deadline:
+        user_id = rng.randrange(n_users) + 1
+        user = {}
+
+        def login():
+            user['row'] = authenticate(f"load{user_id - 1}", PASSWORD)
+            return bool(user['row']) and auth.verify_face_embedding(user_id)
+
+        def scan():
+            moods = wr.detect_emotion()
+            if not moods:
+                return False
+            plan = wr.emotion_plan(moods, user_id)
+            user['emotion_plan_id'] = save_workout_plan(user_id, 'emotion', plan)
+            return not plan.empty
+
+        def plan():
+            target = rng.choice(plan_pool.DURATION_OPTIONS)
+            workouts = wr.duration_plan(target, user_id)
+            user['duration'] = (target, workouts, save_workout_plan(user_id, 'duration', workouts))
+            return True
+
+        def history():
+            # First page of the Workout History page, through the page's own helper
+            plans = get_workout_plans(user_id)[:wr.HISTORY_PAGE_SIZE or None]
+            return bool(wr.history_cards_html(plans))
+
+        def email():
+            target, workouts, plan_id = user['duration']
+            content = wr.generate_email_template("Your Workout Plan", f"load{user_id - 1}", plan_id, workouts,
+                                                 duration_info=target)
+            return wr.send_email(f"load{user_id - 1}@example.com", "Your Workout Plan", content)
+
+        for name, fn in (('login', login), ('scan', scan), ('plan', plan), ('history', history), ('email', email)):
+            if time.monotonic() >= deadline:
+                break
+            timed_flow(name, fn)
+
+
+# Worker process: warm up, wait for the start signal, run its sessions, report
+def _worker(worker_id, session_ids, n_users, duration, ready, start, output):
+    import plan_pool
+    import ranking
+    import workout_recommendation  # noqa: F401 (loads the catalog and models up front)
+    pool_deadline = time.monotonic() + 30
+    while (plan_pool.get_pool() is None or ranking.get_engine() is None) and time.monotonic() < pool_deadline:
+        time.sleep(0.1)
+    ready.put(worker_id)
+    start.wait()
+
+    results = [dict() for _ in session_ids]
+    errors = [dict() for _ in session_ids]
+    deadline = time.monotonic() + duration
+    cpu_before = os.times()
+    threads = [threading.Thread(target=run_session, args=(sid, n_users, deadline, results[i], errors[i]))
+               for i, sid in enumerate(session_ids)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu_after = os.times()
+    cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+
+    merged, merged_errors = {}, {}
+    for session_results, session_errors in zip(results, errors):
+        for name, samples in session_results.items():
+            merged.setdefault(name, []).extend(samples)
+        for name, count in session_errors.items():
+            merged_errors[name] = merged_errors.get(name, 0) + count
+    output.put({'worker': worker_id, 'sessions': len(session_ids), 'latencies': merged, 'errors': merged_errors,
+                'wall_seconds': wall, 'cpu_seconds': cpu, 'cpu_percent': 100 * cpu / wall if wall else 0,
+                'rss_mb': _rss_mb(), 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+
+def run_level(concurrency, n_workers, n_users, duration, ready_timeout):
+    context = multiprocessing.get_context('spawn')
+    ready, output = context.Queue(), context.Queue()
+    start = context.Event()
+    n_workers = min(n_workers, concurrency)
+    assignments = [list(range(w, concurrency, n_workers)) for w in range(n_workers)]
+    workers = [context.Process(target=_worker, args=(w, sessions, n_users, duration, ready, start, output))
+               for w, sessions in enumerate(assignments)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get(timeout=ready_timeout)
+    start.set()
+    reports = []
+    while len(reports) < len(workers):
+        try:
+            reports.append(output.get(timeout=1))
+        except queue_module.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+    for worker in workers:
+        worker.join()
+
+    flows = {}
+    for name in FLOWS:
+        samples = sorted(s for report in reports for s in report['latencies'].get(name, []))
+        failures = sum(report['errors'].get(name, 0) for report in reports)
+        flows[name] = {
+            'completed': len(samples),
+            'failed': failures,
+            'per_second': len(samples) / duration,
+            'p50_ms': _percentile(samples, 0.50) if samples else None,
+            'p95_ms': _percentile(samples, 0.95) if samples else None,
+            'p99_ms': _percentile(samples, 0.99) if samples else None,
+        }
+    return {
+        'concurrency': concurrency,
+        'workers': [{key: report[key] for key in ('worker', 'sessions', 'cpu_seconds', 'cpu_percent', 'rss_mb',
+                                                 'peak_rss_mb')} for report in reports],
+        'lost_workers': len(workers) - len(reports),
+        'throughput_per_second': sum(flow['completed'] for flow in flows.values()) / duration,
+        'flows': flows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the app's flows with simulated sessions.")
+    parser.add_argument('--levels', default='1,2,4,8', help="Comma-separated concurrent session counts")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes sessions are spread over")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds measured per level")
+    parser.add_argument('--users', type=int, default=50, help="Seeded users")
+    parser.add_argument('--frames-dir', help="Face images the synthetic camera replays (default: generated frames)")
+    parser.add_argument('--ready-timeout', type=float, default=300, help="Seconds allowed for workers to warm up")
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='wellness-load-')
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, name='smtp-sink', daemon=True).start()
+    # Workers are spawned, so everything they need travels in the environment
+    os.environ.update({
+        'DB_PATH': os.path.join(directory, 'load.db'),
+        'CAMERA_SOURCE': f"synthetic:{args.frames_dir}" if args.frames_dir else 'synthetic',
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(sink.server_address[1]),
+        'SMTP_STARTTLS': '0',
+        'SMTP_EMAIL': SENDER,
+        'SMTP_PASSWORD': '',
+    })
+    seed_users(args.users)
+
+    levels = []
+    for concurrency in [int(level) for level in args.levels.split(',') if level.strip()]:
+        level = run_level(concurrency, args.workers, args.users, args.duration, args.ready_timeout)
+        levels.append(level)
+        summary = '  '.join(f"{name} p50 {flow['p50_ms']:.0f}/p99 {flow['p99_ms']:.0f} ms" if flow['completed']
+                            else f"{name} -" for name, flow in level['flows'].items())
+        cpu = sum(worker['cpu_percent'] for worker in level['workers'])
+        rss = max((worker['rss_mb'] for worker in level['workers']), default=0)
+        print(f"{concurrency:4} sessions  {level['throughput_per_second']:7.2f} flows/s  cpu {cpu:5.0f}%  "
+              f"max rss {rss:6.0f} MB  {summary}", file=sys.stderr)
+
+    sink.shutdown()
+    report = json.dumps({'users': args.users, 'duration': args.duration, 'emails_received': sink.messages,
+                         'levels': levels}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import (DB_PATH, get_db_connection, dedupe_workout_plans, summarize_old_progress,
+                      archive_old_plans, flush_writes)
+
+# Database maintenance for users.db. Run while the app is idle or lightly
+# loaded; every step works in short transactions.
+
+
+def _format_bytes(count):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(count) < 1024 or unit == 'GB':
+            return f"{count:.1f} {unit}" if unit != 'B' else f"{count} B"
+        count /= 1024
+
+
+def dedupe_plans(args):
+    report = dedupe_workout_plans(batch_size=args.batch_size)
+    if args.vacuum:
+        conn = get_db_connection()
+        conn.execute('VACUUM')
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        report['file_bytes_after'] = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+        conn.close()
+    print(f"Migrated {report['rows_migrated']} plan rows into {report['new_contents']} new content entries",
+          file=sys.stderr)
+    print(f"Plan JSON: {_format_bytes(report['inline_bytes_before'])} inline -> "
+          f"{_format_bytes(report['content_bytes_added'])} stored ({_format_bytes(report['bytes_saved'])} saved)",
+          file=sys.stderr)
+    if 'file_bytes_after' in report:
+        print(f"{DB_PATH}: {_format_bytes(report['file_bytes_before'])} -> "
+              f"{_format_bytes(report['file_bytes_after'])} on disk", file=sys.stderr)
+    else:
+        print(f"{_format_bytes(report['free_bytes_after'])} free in {DB_PATH}; run with --vacuum to shrink the file",
+              file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+# Consistent copy of the live database through the SQLite backup API; copying
+# `pages` at a time lets the app keep writing in between (the copy restarts if it does)
+def snapshot(path, pages=1024):
+    flush_writes()
+    tmp_path = path + '.tmp'
+    source = get_db_connection()
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=pages, sleep=0.01)
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def _incremental(conn):
+    return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+
+# Switch a database created before auto_vacuum=INCREMENTAL over with one full
+# VACUUM. That holds the write lock for the whole rewrite, so it only runs when
+# asked for (retention --convert).
+def convert_to_incremental(conn):
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    print(f"Switching {DB_PATH} to incremental vacuum (one-time full VACUUM)", file=sys.stderr)
+    pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    if not _incremental(conn):
+        raise RuntimeError(f"Could not enable incremental vacuum on {DB_PATH}")
+    return (pages_before - conn.execute('PRAGMA page_count').fetchone()[0]) * page_size
+
+
+# Return free pages to the OS `step` pages per transaction
+def incremental_vacuum(conn, step):
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    freed = 0
+    while True:
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not free_pages:
+            return freed * page_size
+        conn.execute(f'PRAGMA incremental_vacuum({min(free_pages, step)})').fetchall()
+        freed += min(free_pages, step)
+        # Let queued app writes in between steps
+        time.sleep(0.01)
+
+
+def retention(args):
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=args.older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+    report = {'cutoff': cutoff}
+    if args.snapshot:
+        report['snapshot_bytes'] = snapshot(args.snapshot)
+        print(f"Snapshot written to {args.snapshot} ({_format_bytes(report['snapshot_bytes'])})", file=sys.stderr)
+    # Legacy inline plans are moved into plan_contents first so they can be archived too
+    report['plans_deduplicated'] = dedupe_workout_plans(batch_size=args.batch_size)['rows_migrated']
+    report.update(summarize_old_progress(cutoff, batch_size=args.batch_size))
+    report.update(archive_old_plans(cutoff, batch_size=args.batch_size))
+    print(f"Rolled {report['rows_summarized']} progress rows before {cutoff} into monthly summaries", file=sys.stderr)
+    print(f"Archived {report['contents_archived']} plan contents: {_format_bytes(report['json_bytes'])} JSON -> "
+          f"{_format_bytes(report['archived_bytes'])} compressed", file=sys.stderr)
+
+    conn = get_db_connection()
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        report['file_bytes_before_vacuum'] = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+        if _incremental(conn):
+            report['vacuumed_bytes'] = incremental_vacuum(conn, args.vacuum_step)
+        elif args.convert:
+            report['vacuumed_bytes'] = convert_to_incremental(conn)
+        else:
+            report['vacuum_skipped'] = 'auto_vacuum is not INCREMENTAL; rerun with --convert'
+            print(f"Skipped vacuum: {DB_PATH} predates incremental vacuum. Run retention with --convert once, "
+                  f"at a quiet time, to switch it over with one full VACUUM", file=sys.stderr)
+        # One table at a time keeps each statistics transaction short
+        for table in ('workout_plans', 'plan_contents', 'plan_archive', 'progress', 'progress_summaries'):
+            conn.execute(f'ANALYZE {table}')
+        report['file_bytes_after'] = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+    finally:
+        conn.close()
+    print(f"{DB_PATH}: {_format_bytes(report['file_bytes_before_vacuum'])} -> "
+          f"{_format_bytes(report['file_bytes_after'])} on disk", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def snapshot_command(args):
+    size = snapshot(args.path, pages=args.pages)
+    print(f"Snapshot of {DB_PATH} written to {args.path} ({_format_bytes(size)})", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database maintenance tasks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    dedupe = subparsers.add_parser('dedupe-plans', help="Move inline plan JSON into deduplicated plan_contents")
+    dedupe.add_argument('--batch-size', type=int, default=500, help="Rows migrated per transaction")
+    dedupe.add_argument('--vacuum', action='store_true', help="VACUUM afterwards to return freed pages to the OS")
+    dedupe.set_defaults(func=dedupe_plans)
+
+    retain = subparsers.add_parser('retention', help="Summarize old progress, archive old plans, vacuum and analyze")
+    retain.add_argument('--older-than-days', type=int, default=180, help="Age after which rows are rolled up")
+    retain.add_argument('--batch-size', type=int, default=500, help="Rows handled per transaction")
+    retain.add_argument('--vacuum-step', type=int, default=256, help="Pages freed per incremental vacuum step")
+    retain.add_argument('--snapshot', metavar='PATH', help="Back up the database to PATH before changing anything")
+    retain.add_argument('--convert', action='store_true',
+                        help="Switch an older database to incremental vacuum with one full VACUUM "
+                             "(holds the write lock while it runs)")
+    retain.set_defaults(func=retention)
+
+    backup = subparsers.add_parser('snapshot', help="Write a consistent copy of the live database")
+    backup.add_argument('path', help="Destination file")
+    backup.add_argument('--pages', type=int, default=1024, help="Pages copied per step")
+    backup.set_defaults(func=snapshot_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process latency histograms for login, scan, plan and database stages.
+# METRICS_PORT serves them as Prometheus text on /metrics, METRICS_LOG_INTERVAL
+# logs a summary line every N seconds, and TRACE_SAMPLE_RATE attaches full
+# per-stage traces (written to TRACE_DIR/traces.jsonl) to that fraction of sessions.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '0'))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+
+# Bucket upper bounds in seconds, from sub-millisecond SQLite reads to 30 s camera timeouts
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger('wellness.metrics')
+
+_histograms = {}
+_registry_lock = threading.Lock()
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_exporters_started = False
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.total, self.count
+
+
+def _histogram(stage):
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(stage, Histogram())
+    return histogram
+
+
+# Record one observation for a stage
+def observe(stage, seconds):
+    _histogram(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['spans'].append({
+            'stage': stage,
+            'offset_ms': round((time.perf_counter() - seconds - trace['start']) * 1000, 3),
+            'duration_ms': round(seconds * 1000, 3),
+        })
+
+
+# Time a block of code as one stage
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+# Decide once per session whether its requests get full traces
+def should_sample():
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+# Collect every span recorded inside the block into one trace record
+@contextmanager
+def trace(name, sampled, session_id=None):
+    if not sampled:
+        yield
+        return
+    record = {'name': name, 'session_id': session_id, 'started_at': time.time(),
+              'start': time.perf_counter(), 'spans': []}
+    token = _current_trace.set(record)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+        record['duration_ms'] = round((time.perf_counter() - record.pop('start')) * 1000, 3)
+        if record['spans']:
+            _write_trace(record)
+
+
+def _write_trace(record):
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        with open(os.path.join(TRACE_DIR, 'traces.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+    except OSError as e:
+        logger.warning("Failed to write trace: %s", e)
+
+
+# Prometheus text exposition of every histogram
+def render_prometheus():
+    lines = [
+        '# HELP wellness_stage_seconds Latency of app stages in seconds.',
+        '# TYPE wellness_stage_seconds histogram',
+    ]
+    for stage in sorted(_histograms):
+        counts, total, count = _histograms[stage].snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'wellness_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'wellness_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'wellness_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'wellness_stage_seconds_count{{stage="{stage}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+# Approximate quantile from bucket counts (upper bound of the matching bucket)
+def quantile(stage, q):
+    counts, _, count = _histogram(stage).snapshot()
+    if not count:
+        return None
+    rank = q * count
+    cumulative = 0
+    for bound, bucket_count in zip(BUCKETS + (float('inf'),), counts):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return bound
+    return float('inf')
+
+
+# One-line summary: count, mean and p95 per stage
+def summary_line():
+    parts = []
+    for stage in sorted(_histograms):
+        _, total, count = _histograms[stage].snapshot()
+        if count:
+            parts.append(f"{stage} n={count} mean={total / count * 1000:.1f}ms p95<={quantile(stage, 0.95) * 1000:.0f}ms")
+    return '; '.join(parts)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _log_periodically(interval):
+    while True:
+        time.sleep(interval)
+        line = summary_line()
+        if line:
+            logger.info("stage latency: %s", line)
+
+
+# Start the configured exporters once per process
+def start_exporters():
+    global _exporters_started
+    with _registry_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on port %s: %s", METRICS_PORT, e)
+    if METRICS_LOG_INTERVAL > 0:
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(logging.INFO)
+        threading.Thread(target=_log_periodically, args=(METRICS_LOG_INTERVAL,),
+                         name='metrics-log', daemon=True).start()
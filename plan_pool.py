@@ -0,0 +1,180 @@
+import itertools
+import logging
+import os
+import random
+import threading
+import zlib
+
+import numpy as np
+
+from emotion_analysis import MOODS
+from plan_render import LRUCache
+from workout_catalog import CATALOG_PATH, read_catalog, duration_catalog, catalog_fingerprint
+
+# Precomputed plan pools: for every ordered mood combination detect_emotion()
+# can return (up to three moods) and every duration option, a handful of
+# diverse, validated plans are built in a background thread and stored as
+# int16 row indices into the catalog. Serving is a rotation through the pool,
+# so repeat requests from the same user walk through different plans. Pools
+# are rebuilt when the catalog file changes.
+DURATION_OPTIONS = [15, 30, 45, 60]
+PLAN_POOL_SIZE = int(os.getenv('PLAN_POOL_SIZE', '12'))
+# Rotation positions kept for this many (user, pool) pairs; evicted users restart at their hash offset
+PLAN_CURSOR_LIMIT = int(os.getenv('PLAN_CURSOR_LIMIT', '10000'))
+MAX_PLAN_MOODS = 3
+MAX_EMOTION_PLAN_LENGTH = 20
+
+logger = logging.getLogger(__name__)
+
+
+class PlanPool:
+    def __init__(self, fingerprint, emotion_table, emotion_plans, duration_table, duration_plans):
+        self.fingerprint = fingerprint
+        self.emotion_table = emotion_table
+        self.emotion_plans = emotion_plans
+        self.duration_table = duration_table
+        self.duration_plans = duration_plans
+
+
+# Keep the first occurrence of each exercise name (some appear under several moods)
+def _dedupe(indices, names):
+    seen = set()
+    kept = []
+    for i in indices:
+        if names[i] not in seen:
+            seen.add(names[i])
+            kept.append(i)
+    return kept
+
+
+# Distinct non-empty plans, in order, up to the pool size
+def _unique_plans(candidates):
+    plans, seen = [], set()
+    for plan in candidates:
+        key = tuple(plan)
+        if key and key not in seen:
+            seen.add(key)
+            plans.append(np.array(plan, dtype=np.int16))
+        if len(plans) >= PLAN_POOL_SIZE:
+            break
+    return plans
+
+
+def _build_emotion_plans(catalog, rng):
+    names = catalog['Exercise'].to_numpy()
+    mood_rows = {mood: np.flatnonzero(catalog['Mood'].apply(lambda tags, m=mood.lower(): m in tags).to_numpy())
+                 for mood in MOODS}
+    plans = {}
+    for size in range(1, MAX_PLAN_MOODS + 1):
+        for moods in itertools.permutations(MOODS, size):
+            # First variant follows recommend_workouts() order (mood by mood, catalog order)
+            # with repeated exercises dropped
+            candidates = [_dedupe(np.concatenate([mood_rows[m] for m in moods]), names)[:MAX_EMOTION_PLAN_LENGTH]]
+            for _ in range(PLAN_POOL_SIZE * 2):
+                # Interleave shuffled rows so every detected mood is represented
+                shuffled = [rng.permutation(mood_rows[m]) for m in moods]
+                interleaved = [i for group in itertools.zip_longest(*shuffled) for i in group if i is not None]
+                candidates.append(_dedupe(interleaved, names)[:MAX_EMOTION_PLAN_LENGTH])
+            pool = _unique_plans(candidates)
+            if pool:
+                plans[moods] = pool
+    return plans
+
+
+def _build_duration_plans(table, rng):
+    names = table['name'].to_numpy()
+    durations = table['duration'].to_numpy()
+    plans = {}
+    for target in DURATION_OPTIONS:
+        candidates = []
+        for _ in range(PLAN_POOL_SIZE * 4):
+            # Same greedy random fill as recommend_workouts_by_duration(), without repeated exercises
+            chosen, seen, remaining = [], set(), target
+            for i in rng.permutation(len(table)):
+                if durations[i] <= remaining and names[i] not in seen:
+                    chosen.append(i)
+                    seen.add(names[i])
+                    remaining -= durations[i]
+                    if remaining == 0:
+                        break
+            candidates.append(chosen)
+        # Plans that fill the requested time exactly come first
+        candidates.sort(key=lambda plan: target - durations[plan].sum() if plan else target)
+        plans[target] = _unique_plans(candidates)
+    return plans
+
+
+# Build every pool synchronously
+def build_pool(path=CATALOG_PATH, seed=None):
+    fingerprint = catalog_fingerprint(path)
+    rng = np.random.default_rng(seed)
+    catalog = read_catalog(path)
+    emotion_table = catalog.rename(columns={
+        'Exercise': 'name', 'Sets': 'type', 'Video_Link': 'link', 'Duration': 'duration'
+    })[['name', 'type', 'link', 'duration']]
+    duration_table = duration_catalog(path)
+    return PlanPool(fingerprint, emotion_table, _build_emotion_plans(catalog, rng),
+                    duration_table, _build_duration_plans(duration_table, rng))
+
+
+_pool = None
+_building = False
+_lock = threading.Lock()
+_cursors = LRUCache(PLAN_CURSOR_LIMIT)
+
+
+def _build_in_background(path):
+    global _pool, _building
+    try:
+        _pool = build_pool(path)
+    except Exception as e:
+        logger.warning("Plan pool build failed: %s", e)
+    finally:
+        with _lock:
+            _building = False
+
+
+# Current pool, kicking off a background (re)build if it is missing or stale.
+# Returns None until the first build finishes; callers fall back to computing plans.
+def get_pool(path=CATALOG_PATH):
+    global _building
+    try:
+        fingerprint = catalog_fingerprint(path)
+    except OSError:
+        return _pool
+    if _pool is None or _pool.fingerprint != fingerprint:
+        with _lock:
+            if not _building:
+                _building = True
+                threading.Thread(target=_build_in_background, args=(path,), name='plan-pool', daemon=True).start()
+    return _pool
+
+
+# Next plan for this user from a pool, starting at a per-user offset
+def _rotate(plans, user_key, pool_key):
+    cursor_key = (user_key, pool_key)
+    with _lock:
+        cursor = _cursors.get(cursor_key)
+        if cursor is None:
+            cursor = zlib.crc32(str(user_key).encode()) if user_key is not None else random.randrange(len(plans))
+        _cursors.put(cursor_key, cursor + 1)
+    return plans[cursor % len(plans)]
+
+
+# Emotion plan (name/type/link/duration) for moods in detection order, or None if not pooled yet
+def emotion_plan(moods, user_key=None):
+    pool = get_pool()
+    key = tuple(moods[:MAX_PLAN_MOODS])
+    if pool is None or key not in pool.emotion_plans:
+        return None
+    plan = _rotate(pool.emotion_plans[key], user_key, ('emotion', key))
+    return pool.emotion_table.iloc[plan].reset_index(drop=True)
+
+
+# Duration plan for one of DURATION_OPTIONS, or None if not pooled yet
+def duration_plan(target_duration, user_key=None):
+    pool = get_pool()
+    if pool is None or not pool.duration_plans.get(target_duration):
+        return None
+    plan = _rotate(pool.duration_plans[target_duration], user_key, ('duration', target_duration))
+    return pool.duration_table.iloc[plan].reset_index(drop=True)
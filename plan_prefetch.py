@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError
+
+import plan_pool
+
+# Per-session prefetch of duration plans. When the duration page opens, a plan
+# for every option in DURATION_OPTIONS is computed on a small shared thread
+# pool (served from the shared plan pools when they are ready, otherwise by
+# the page's planner), so "Generate Plan" shows a finished plan. A consumed
+# option is refilled in the background. Work is cancelled on logout, when the
+# user changes, and when Streamlit drops the session state holding it.
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '2'))
+PREFETCH_WAIT = float(os.getenv('PREFETCH_WAIT', '5'))
+
+SESSION_KEY = 'duration_prefetch'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='plan-prefetch')
+    return _executor
+
+
+# Runs on the pool; holds only the cancel event, never the session
+def _compute(cancelled, target, user_key, planner):
+    if cancelled.is_set():
+        return None
+    plan = plan_pool.duration_plan(target, user_key)
+    if plan is None and not cancelled.is_set():
+        plan = planner(target)
+    return plan
+
+
+def _cancel(cancelled, futures):
+    cancelled.set()
+    for future in list(futures.values()):
+        future.cancel()
+
+
+class DurationPrefetch:
+    def __init__(self, user_key, planner):
+        self.user_key = user_key
+        self.planner = planner
+        self.cancelled = threading.Event()
+        self.futures = {}
+        # Streamlit drops session state when the session ends; stop its work then too
+        self._finalizer = weakref.finalize(self, _cancel, self.cancelled, self.futures)
+
+    def _submit(self, target):
+        if not self.cancelled.is_set():
+            self.futures[target] = _get_executor().submit(_compute, self.cancelled, target, self.user_key, self.planner)
+
+    def start(self, targets=None):
+        for target in targets or plan_pool.DURATION_OPTIONS:
+            if target not in self.futures:
+                self._submit(target)
+
+    # Prefetched plan for target (waiting for it if it is already being computed),
+    # or None when the caller should compute one itself
+    def take(self, target):
+        future = self.futures.pop(target, None)
+        if future is None or self.cancelled.is_set():
+            return None
+        plan = None
+        # One still queued behind other work is dropped; computing inline is no slower
+        if not future.cancel():
+            try:
+                plan = future.result(timeout=PREFETCH_WAIT)
+            except (CancelledError, TimeoutError):
+                plan = None
+            except Exception as e:
+                logger.warning("Prefetching a %s-minute plan failed: %s", target, e)
+        self._submit(target)
+        return plan
+
+    def cancel(self):
+        self._finalizer()
+
+
+# The session's prefetcher, started on first use and restarted for a new user
+def for_session(session_state, user_key, planner):
+    prefetch = session_state.get(SESSION_KEY)
+    if prefetch is not None and (prefetch.user_key != user_key or prefetch.cancelled.is_set()):
+        prefetch.cancel()
+        prefetch = None
+    if prefetch is None:
+        prefetch = session_state[SESSION_KEY] = DurationPrefetch(user_key, planner)
+    prefetch.start()
+    return prefetch
+
+
+def cancel_session(session_state):
+    prefetch = session_state.get(SESSION_KEY)
+    if prefetch is not None:
+        prefetch.cancel()
+        session_state[SESSION_KEY] = None
@@ -0,0 +1,258 @@
+import os
+import threading
+from collections import OrderedDict
+from html import escape
+
+# HTML renderers shared by the plan emails, the shared plan pages and the
+# card lists on the Streamlit pages. Card lists are built from column arrays
+# in one pass and cached by plan id: saved plans never change, so a cached
+# list never goes stale.
+PLAN_HTML_CACHE_SIZE = int(os.getenv('PLAN_HTML_CACHE_SIZE', '2048'))
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_html_cache = LRUCache(PLAN_HTML_CACHE_SIZE)
+
+
+# HTML from build(), cached under key when it names a saved plan (plan id not None)
+def cached_html(key, plan_id, build):
+    if plan_id is None:
+        return build()
+    key = (key, plan_id)
+    html = _html_cache.get(key)
+    if html is None:
+        html = build()
+        _html_cache.put(key, html)
+    return html
+
+
+# Workout cards for a plan's rows (or a page of them), numbered by row index
+def workout_cards_html(workouts):
+    columns = [workouts[column].to_numpy() for column in ('name', 'type', 'link', 'duration')]
+    return ''.join(
+        f"<div class='workout-card'><h4><a href=\"{escape(str(link))}\" target=\"_blank\">{number}. {escape(str(name))}</a></h4>"
+        f"<p>Sets: {escape(str(sets))}</p><p>Duration: {duration} min</p></div>"
+        for number, name, sets, link, duration in zip(workouts.index.to_numpy() + 1, *columns)
+    )
+
+
+# One Workout History card: plan type, date and its exercises
+def history_card_html(plan_type, created_at, workouts):
+    columns = [workouts[column].to_numpy() for column in ('name', 'type', 'duration')]
+    items = ''.join(f"<li>{escape(str(name))} ({escape(str(sets))}) - {duration} min</li>"
+                    for name, sets, duration in zip(*columns))
+    return f"<div class='stCard'><h4>{escape(plan_type.capitalize())} Plan - {created_at}</h4><ul>{items}</ul></div>"
+
+
+# Full plan page: header image, title, intro/body paragraphs and the workout list
+def render_plan_html(title, intro_text, body_text, workouts):
+    # Theme settings
+    primary_color = '#C0392B'  # Vibrant red
+    secondary_color = '#000000'  # Pure black
+    accent_color = '#FFFFFF'  # White
+    background_color = '#1C2526'  # Dark charcoal
+    font_heading = 'Poppins'
+    font_body = 'Roboto'
+
+    items = ''.join(f"""
+                                <li>
+                                    <span>{index + 1}.</span> <a href='{escape(str(row['link']))}'>{escape(str(row['name']))} ({escape(str(row['type']))}) - {row['duration']} min</a>
+                                </li>
+                                """ for index, row in enumerate(workouts.to_dict('records')))
+
+    content = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@600&family=Roboto:wght@400;500&display=swap" rel="stylesheet">
+    <style>
+        body {{
+            margin: 0;
+            padding: 0;
+            font-family: '{font_body}', 'Helvetica', 'Arial', sans-serif;
+            background-color: {background_color};
+            color: #FFFFFF;
+        }}
+        .outer-container {{
+            width: 100%;
+            background: {background_color};
+            padding: 20px 0;
+        }}
+        .inner-container {{
+            max-width: 900px;
+            margin: 0 auto;
+            background: #2D2D2D;
+            border-radius: 10px;
+            border: 2px solid {primary_color};
+        }}
+        .header {{
+            padding: 0;
+            text-align: center;
+            background: {secondary_color};
+        }}
+        .header img {{
+            width: 100%;
+            height: auto;
+            border-radius: 10px 10px 0 0;
+            display: block;
+        }}
+        .content {{
+            padding: 35px;
+        }}
+        h1 {{
+            font-family: '{font_heading}', 'Helvetica', sans-serif;
+            color: {primary_color};
+            font-size: 26px;
+            margin: 0 0 20px;
+            text-align: center;
+            font-weight: 500;
+        }}
+        p {{
+            font-size: 16px;
+            line-height: 1.6;
+            margin: 0 0 15px;
+            color: #D3D3D3;
+        }}
+        ul {{
+            list-style: none;
+            padding: 0;
+            margin: 0 0 25px;
+        }}
+        li {{
+            font-size: 18px;
+            margin: 15px 0;
+            display: block;
+        }}
+        li span {{
+            color: {accent_color}; /* Match numbers to white text */
+            margin-right: 10px;
+        }}
+        a {{
+            color: {accent_color}; /* White links */
+            text-decoration: none;
+            font-weight: 500;
+        }}
+        a:hover {{
+            text-decoration: underline;
+        }}
+        .button {{
+            display: inline-block;
+            padding: 12px 30px;
+            background: {primary_color};
+            color: {accent_color};
+            text-align: center;
+            border-radius: 5px;
+            font-size: 16px;
+            font-weight: 500;
+            margin: 20px auto;
+            display: block;
+            width: fit-content;
+            text-decoration: none;
+            transition: background 0.3s ease;
+        }}
+        .button:hover {{
+            background: #E74C3C;
+        }}
+        .footer {{
+            background: {secondary_color};
+            padding: 20px;
+            text-align: center;
+            font-size: 12px;
+            color: #D3D3D3;
+            border-top: 2px solid {primary_color};
+            border-radius: 0 0 10px 10px;
+        }}
+        .footer a {{
+            color: #E74C3C;
+            text-decoration: none;
+            font-weight: 500;
+        }}
+        .footer a:hover {{
+            text-decoration: underline;
+        }}
+        @media only screen and (max-width: 900px) {{
+            .inner-container {{
+                max-width: 95%;
+                margin: 0 auto;
+            }}
+            .content {{
+                padding: 20px;
+            }}
+            h1 {{
+                font-size: 22px;
+            }}
+            p, li {{
+                font-size: 16px;
+            }}
+            .button {{
+                padding: 10px 25px;
+                font-size: 14px;
+            }}
+            .header img {{
+                border-radius: 8px 8px 0 0;
+            }}
+        }}
+    </style>
+</head>
+<body>
+    <table class="outer-container" width="100%" cellpadding="0" cellspacing="0">
+        <tr>
+            <td>
+                <table class="inner-container" width="100%" cellpadding="0" cellspacing="0">
+                    <tr>
+                        <td class="header">
+                            <img src="https://images.unsplash.com/photo-1593079831268-3381b0db4a77?ixlib=rb-4.0.3&auto=format&fit=crop&w=800&q=80" alt="Fitness Header" />
+                        </td>
+                    </tr>
+                    <tr>
+                        <td class="content">
+                            <h1>{escape(title)}</h1>
+                            <p>{escape(intro_text)}</p>
+                            <p>{escape(body_text)}</p>
+                            <ul>
+                                {items}
+                            </ul>
+                            <span class="button">Start Your Workout</span>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td class="footer">
+                            <p>Created by Kevin Mevada</p>
+                            <p><a href="https://github.com/kevinmevada">GitHub</a> | <a href="https://linkedin.com/in/kevinmevada">LinkedIn</a></p>
+                            <p>© 2025 Emotion Powered Wellness and Fitness Guide Companion. All Rights Reserved.</p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+"""
+    return content
@@ -0,0 +1,240 @@
+import argparse
+import gzip
+import io
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from metrics import timed
+from plan_render import LRUCache, render_plan_html
+
+# Read-only pages for shared plans: GET /plan/<token> renders the workout_plans
+# row its owner shared (database.share_workout_plan) with the email template.
+# Plans that were never shared, or were unshared, are not reachable at all.
+# Plans never change once saved, so pages are rendered once per (plan id,
+# content hash) into an in-memory LRU (plain and gzip bodies), answered with a
+# strong ETag and Last-Modified, and marked cacheable by browsers and any CDN
+# in front of the server. A hit costs one indexed token lookup for the plan's
+# hash on a pooled connection.
+PLAN_BASE_URL = os.getenv('PLAN_BASE_URL', 'http://localhost:8502').rstrip('/')
+PLAN_SERVER_HOST = os.getenv('PLAN_SERVER_HOST', '127.0.0.1')
+PLAN_SERVER_PORT = int(os.getenv('PLAN_SERVER_PORT', '8502'))
+PLAN_CACHE_SIZE = int(os.getenv('PLAN_CACHE_SIZE', '1024'))
+PLAN_CACHE_MAX_AGE = int(os.getenv('PLAN_CACHE_MAX_AGE', '3600'))
+
+# Bump when the page template changes so cached copies are revalidated
+RENDER_VERSION = '1'
+
+# Share tokens are secrets.token_urlsafe() strings
+SHARE_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+logger = logging.getLogger(__name__)
+
+
+# Public link for a shared plan's token
+def plan_url(share_token):
+    return f"{PLAN_BASE_URL}/plan/{share_token}"
+
+
+class RenderedPlan:
+    def __init__(self, etag, last_modified, body):
+        self.etag = etag
+        # Each encoding is its own representation, so it gets its own strong validator
+        self.gzip_etag = etag[:-1] + '-gzip"'
+        self.last_modified = last_modified
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+
+
+_cache = LRUCache(PLAN_CACHE_SIZE)
+# Request threads are short-lived, so connections are pooled rather than per thread
+_connections = queue.LifoQueue()
+
+
+def _acquire_connection():
+    try:
+        return _connections.get_nowait()
+    except queue.Empty:
+        from database import get_db_connection
+        return get_db_connection()
+
+
+def _last_modified(created_at):
+    try:
+        return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def render_shared_plan(plan_type, workouts):
+    if plan_type in ('emotion', 'group'):
+        body_text = "A workout plan tailored to how its owner was feeling, ready to energize your day!"
+    else:
+        body_text = f"A {workouts['duration'].sum()}-minute workout plan set to boost your fitness!"
+    return render_plan_html("Shared Workout Plan", "Hello,", body_text, workouts)
+
+
+# Rendered page for a share token, or None if no plan is shared under it
+def get_page(share_token):
+    conn = _acquire_connection()
+    try:
+        return _get_page(conn, share_token)
+    finally:
+        _connections.put(conn)
+
+
+def _get_page(conn, share_token):
+    from database import PLAN_SELECT, normalize_plan_json, plan_content_hash
+    header = conn.execute('SELECT id, content_hash FROM workout_plans WHERE share_token = ?',
+                          (share_token,)).fetchone()
+    if header is None:
+        return None
+    plan_id = header['id']
+    if header['content_hash'] is not None:
+        page = _cache.get((plan_id, header['content_hash']))
+        if page is not None:
+            return page
+    row = conn.execute(PLAN_SELECT + ' WHERE w.id = ?', (plan_id,)).fetchone()
+    if row is None:
+        return None
+    data = row['data']
+    content_hash = row['content_hash']
+    if content_hash is None:
+        # Plans saved before content addressing hash the same way once migrated
+        data = normalize_plan_json(data)
+        content_hash = plan_content_hash(data)
+        page = _cache.get((plan_id, content_hash))
+        if page is not None:
+            return page
+    with timed('plan_render'):
+        workouts = pd.read_json(io.StringIO(data))
+        body = render_shared_plan(row['type'], workouts).encode('utf-8')
+    page = RenderedPlan(f'"{content_hash[:32]}-{RENDER_VERSION}"', _last_modified(row['created_at']), body)
+    _cache.put((plan_id, content_hash), page)
+    return page
+
+
+# Whether an Accept-Encoding header allows gzip: the q-value of gzip, else of *
+def accepts_gzip(accept_encoding):
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class PlanRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'PlanServer/1.0'
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'plan' or not SHARE_TOKEN_PATTERN.fullmatch(parts[1]):
+            self._send_error(404, "Not found")
+            return
+        try:
+            page = get_page(parts[1])
+        except Exception as e:
+            logger.exception("Rendering a shared plan failed: %s", e)
+            self._send_error(500, "Could not render this plan")
+            return
+        if page is None:
+            self._send_error(404, "This plan does not exist or is no longer shared")
+            return
+
+        use_gzip = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag = page.gzip_etag if use_gzip else page.etag
+        if self._not_modified(page, etag):
+            self.send_response(304)
+            self._send_cache_headers(page, etag)
+            self.end_headers()
+            return
+        body = page.gzip_body if use_gzip else page.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self._send_cache_headers(page, etag)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _not_modified(self, page, etag):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # If-None-Match uses weak comparison, so W/ prefixes added by proxies still match
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+            return if_none_match.strip() == '*' or etag in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return page.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_cache_headers(self, page, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', format_datetime(page.last_modified, usegmt=True))
+        self.send_header('Cache-Control', f'public, max-age={PLAN_CACHE_MAX_AGE}, stale-while-revalidate=86400')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def _send_error(self, status, message):
+        body = f"<!DOCTYPE html><html><body><h1>{status}</h1><p>{message}</p></body></html>".encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        # A missing plan may just not be committed yet, so no error is cached
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve shared workout plans at /plan/<token>.")
+    parser.add_argument('--host', default=PLAN_SERVER_HOST, help="Interface to bind")
+    parser.add_argument('--port', type=int, default=PLAN_SERVER_PORT, help="Port to listen on")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    import metrics
+    metrics.start_exporters()
+    server = ThreadingHTTPServer((args.host, args.port), PlanRequestHandler)
+    server.daemon_threads = True
+    logger.info("Serving shared plans on http://%s:%d/plan/<token>", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Opt-in profiling of page runs. PROFILE_SAMPLE_RATE (default 0, off) is the
+# fraction of page runs captured with cProfile and, if PROFILE_MEMORY is on,
+# tracemalloc. Each capture writes PROFILE_DIR/<page>/<timestamp>.prof (load it
+# with pstats or snakeviz) and a .txt report with the top PROFILE_TOP_N
+# functions by cumulative time and allocation sites still live when the page
+# finished; only the newest PROFILE_KEEP captures per page are kept. When off,
+# a page run costs one float comparison.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', '25'))
+PROFILE_MEMORY = os.getenv('PROFILE_MEMORY', '1') == '1'
+PROFILE_TRACEBACK_FRAMES = int(os.getenv('PROFILE_TRACEBACK_FRAMES', '1'))
+
+logger = logging.getLogger('wellness.profiling')
+
+# tracemalloc is process-wide on every Python version: a second session
+# starting or stopping it would corrupt the first one's report. cProfile
+# depends on the version. Before 3.12 it installs a per-thread hook, so
+# concurrent captures would not clash and each sees only its own thread. From
+# 3.12 it sits on sys.monitoring, which allows one active profiler per process,
+# so a second enable() raises ValueError and the profile includes calls made
+# by other threads during the capture. Either way one capture runs at a time,
+# and a page run that would overlap another session's capture is simply not
+# sampled.
+_capture_lock = threading.Lock()
+
+
+def _should_profile():
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+# Profile the block as one run of page `name` when it is sampled
+@contextmanager
+def profile_page(name):
+    if not _should_profile() or not _capture_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        with _capture(name):
+            yield
+    finally:
+        _capture_lock.release()
+
+
+@contextmanager
+def _capture(name):
+    started_tracing = PROFILE_MEMORY and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(PROFILE_TRACEBACK_FRAMES)
+    elif tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+        # Python 3.9+; on 3.8 the peak covers the whole tracing session
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another tool (a debugger, coverage) holds the profiler slot; keep the memory report only
+        profiler = None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        snapshot = peak = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            _write_capture(name, elapsed, profiler, snapshot, peak)
+        except OSError as e:
+            logger.warning("Failed to write profile for %s: %s", name, e)
+
+
+def _write_capture(name, elapsed, profiler, snapshot, peak):
+    directory = os.path.join(PROFILE_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}")
+    lines = [f"page: {name}", f"duration: {elapsed * 1000:.1f} ms"]
+    if profiler is not None:
+        profiler.dump_stats(base + '.prof')
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+        lines += ["", f"Top {PROFILE_TOP_N} functions by cumulative time:", out.getvalue().strip()]
+    if snapshot is not None:
+        lines += ["", f"peak traced memory: {peak / 1024:.1f} KiB", "",
+                  f"Top {PROFILE_TOP_N} allocation sites (live at the end of the page):"]
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        for stat in snapshot.statistics('traceback' if PROFILE_TRACEBACK_FRAMES > 1 else 'lineno')[:PROFILE_TOP_N]:
+            lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback.format()[0].strip()}")
+            lines += [f"{'':30}{frame.strip()}" for frame in stat.traceback.format()[1:]]
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    _rotate(directory)
+
+
+# Drop the oldest captures beyond PROFILE_KEEP for a page
+def _rotate(directory):
+    runs = sorted({entry.rsplit('.', 1)[0] for entry in os.listdir(directory) if entry.endswith(('.prof', '.txt'))})
+    for run in runs[:max(0, len(runs) - PROFILE_KEEP)]:
+        for extension in ('.prof', '.txt'):
+            try:
+                os.remove(os.path.join(directory, run + extension))
+            except FileNotFoundError:
+                pass
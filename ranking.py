@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from workout_catalog import read_catalog
+
+# Personalized ranking of catalog exercises for emotion-based plans.
+# Affinities live in a sparse user x exercise matrix: a CSR snapshot built
+# from the progress table at startup plus per-user delta rows that
+# record_progress() (called by every database.save_progress) updates
+# incrementally, folded back into the CSR once RANKING_COMPACT_AFTER deltas
+# have accumulated. The engine is built in a background thread; until it is
+# ready, plans come from the plan pool. Each process (Streamlit worker, plan
+# server) has its own engine and record_progress() only updates that one, so
+# the engine is rebuilt in the background every RANKING_REFRESH_SECONDS (0
+# disables) to pick up progress saved by other processes. Candidates are
+# scored with vectorized NumPy over catalog rows: mood match (earlier moods
+# weigh more), popularity (the sum over users of their positive affinity for an
+# exercise) and the user's own affinity.
+RANKING_USER_WEIGHT = float(os.getenv('RANKING_USER_WEIGHT', '1.0'))
+RANKING_POPULARITY_WEIGHT = float(os.getenv('RANKING_POPULARITY_WEIGHT', '0.2'))
+RANKING_COMPACT_AFTER = int(os.getenv('RANKING_COMPACT_AFTER', '10000'))
+RANKING_REFRESH_SECONDS = float(os.getenv('RANKING_REFRESH_SECONDS', '300'))
+
+# Affinity added to every exercise of a plan
+COMPLETED_WEIGHT = 1.0
+NOT_COMPLETED_WEIGHT = -0.5
+POSITIVE_FEEDBACK_WEIGHT = 0.5
+NEGATIVE_FEEDBACK_WEIGHT = -0.5
+POSITIVE_WORDS = ('great', 'good', 'love', 'fun', 'enjoy', 'awesome', 'easy')
+NEGATIVE_WORDS = ('hard', 'boring', 'hate', 'pain', 'hurt', 'bad', 'tired')
+
+# Bonus for matching the 1st, 2nd and 3rd detected mood
+MOOD_ORDER_WEIGHTS = (3.0, 2.5, 2.0)
+
+logger = logging.getLogger(__name__)
+
+
+# Plan-level affinity from a progress entry
+def progress_weight(completed, feedback):
+    weight = COMPLETED_WEIGHT if completed else NOT_COMPLETED_WEIGHT
+    text = (feedback or '').lower()
+    if any(word in text for word in POSITIVE_WORDS):
+        weight += POSITIVE_FEEDBACK_WEIGHT
+    if any(word in text for word in NEGATIVE_WORDS):
+        weight += NEGATIVE_FEEDBACK_WEIGHT
+    return weight
+
+
+class RankingEngine:
+    def __init__(self, catalog):
+        self.catalog = catalog.reset_index(drop=True)
+        self.names = self.catalog['Exercise'].to_numpy()
+        self.exercises, self.row_exercise = np.unique(self.names, return_inverse=True)
+        self.exercise_index = {name: i for i, name in enumerate(self.exercises)}
+        tags = self.catalog['Mood']
+        moods = sorted({tag for row in tags for tag in row})
+        self.mood_masks = {mood: np.fromiter((mood in row for row in tags), dtype=bool, count=len(tags))
+                           for mood in moods}
+        # Tiny decreasing prior keeps catalog order among equal scores
+        self.prior = np.linspace(1e-3, 0, len(self.catalog))
+        self.popularity = np.zeros(len(self.exercises))
+        self.user_index = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.data = np.zeros(0, dtype=np.float32)
+        self.deltas = {}
+        self.delta_count = 0
+        self.lock = threading.RLock()
+
+    def _user_row(self, user_id, create=False):
+        row = self.user_index.get(user_id)
+        if row is None and create:
+            row = self.user_index[user_id] = len(self.user_index)
+        return row
+
+    # Bulk-load (user_id, exercise column, value) triples into the CSR snapshot
+    def load_arrays(self, user_ids, columns, values):
+        with self.lock:
+            rows = np.fromiter((self._user_row(u, create=True) for u in user_ids), dtype=np.int64, count=len(user_ids))
+            columns = np.asarray(columns, dtype=np.int32)
+            values = np.asarray(values, dtype=np.float32)
+            self._rebuild(rows, columns, values)
+
+    # Merge existing CSR entries and deltas with new triples, summing duplicates
+    def _rebuild(self, rows, columns, values):
+        existing_rows = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        delta_rows, delta_columns, delta_values = [], [], []
+        for row, entries in self.deltas.items():
+            for column, value in entries.items():
+                delta_rows.append(row)
+                delta_columns.append(column)
+                delta_values.append(value)
+        rows = np.concatenate([existing_rows, np.asarray(delta_rows, dtype=np.int64), rows])
+        columns = np.concatenate([self.indices, np.asarray(delta_columns, dtype=np.int32), columns])
+        values = np.concatenate([self.data, np.asarray(delta_values, dtype=np.float32), values])
+        order = np.lexsort((columns, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        if len(rows):
+            starts = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])])
+            values = np.add.reduceat(values, starts)
+            rows, columns = rows[starts], columns[starts]
+        self.indptr = np.zeros(len(self.user_index) + 1, dtype=np.int64)
+        np.add.at(self.indptr, rows + 1, 1)
+        self.indptr = np.cumsum(self.indptr)
+        self.indices = columns.astype(np.int32)
+        self.data = values.astype(np.float32)
+        self.deltas = {}
+        self.delta_count = 0
+        self.popularity = np.bincount(self.indices, weights=np.maximum(self.data, 0), minlength=len(self.exercises))
+
+    # A user's current affinity for one exercise (CSR entry plus pending delta)
+    def _cell(self, row, column):
+        value = self.deltas.get(row, {}).get(column, 0.0)
+        if row + 1 < len(self.indptr):
+            start, end = self.indptr[row], self.indptr[row + 1]
+            i = start + np.searchsorted(self.indices[start:end], column)
+            if i < end and self.indices[i] == column:
+                value += float(self.data[i])
+        return value
+
+    # Incremental update: only this user's delta row and the popularity vector change
+    def update(self, user_id, exercise_names, weight):
+        columns = [self.exercise_index[name] for name in exercise_names if name in self.exercise_index]
+        if not columns:
+            return
+        with self.lock:
+            row = self._user_row(user_id, create=True)
+            delta = self.deltas.setdefault(row, {})
+            for column in columns:
+                # Same popularity rule as _rebuild: only the positive part of each user's affinity counts
+                old = self._cell(row, column)
+                delta[column] = delta.get(column, 0.0) + weight
+                self.popularity[column] += max(old + weight, 0.0) - max(old, 0.0)
+            self.delta_count += len(columns)
+            if self.delta_count >= RANKING_COMPACT_AFTER:
+                self._rebuild(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+    # Sparse affinity row of a user as (columns, values)
+    def user_affinity(self, user_id):
+        with self.lock:
+            row = self.user_index.get(user_id)
+            if row is None:
+                return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            start, end = (self.indptr[row], self.indptr[row + 1]) if row + 1 < len(self.indptr) else (0, 0)
+            columns, values = self.indices[start:end], self.data[start:end]
+            delta = self.deltas.get(row)
+            if delta:
+                columns = np.concatenate([columns, np.fromiter(delta.keys(), dtype=np.int32, count=len(delta))])
+                values = np.concatenate([values, np.fromiter(delta.values(), dtype=np.float32, count=len(delta))])
+            return columns, values
+
+    def has_history(self, user_id):
+        return len(self.user_affinity(user_id)[0]) > 0
+
+    # Catalog row indices of the best `limit` distinct exercises for these moods
+    def rank(self, moods, user_id=None, limit=20):
+        mood_bonus = np.zeros(len(self.catalog))
+        for weight, mood in zip(MOOD_ORDER_WEIGHTS, moods):
+            mask = self.mood_masks.get(mood.lower().strip())
+            if mask is not None:
+                np.maximum(mood_bonus, weight * mask, out=mood_bonus)
+        candidates = np.flatnonzero(mood_bonus)
+        if not len(candidates):
+            return candidates
+        exercise_scores = RANKING_POPULARITY_WEIGHT * np.log1p(self.popularity)
+        columns, values = self.user_affinity(user_id)
+        if len(columns):
+            user_scores = np.zeros(len(self.exercises))
+            np.add.at(user_scores, columns, values)
+            exercise_scores = exercise_scores + RANKING_USER_WEIGHT * np.tanh(user_scores)
+        scores = mood_bonus[candidates] + self.prior[candidates] + exercise_scores[self.row_exercise[candidates]]
+        ordered = candidates[np.argsort(-scores, kind='stable')]
+        # Same exercise can appear under several moods; keep its best-scoring row
+        _, first = np.unique(self.row_exercise[ordered], return_index=True)
+        return ordered[np.sort(first)][:limit]
+
+
+# Exercise names of a stored plan's JSON (empty if it cannot be read)
+def plan_exercise_names(data):
+    try:
+        return list(json.loads(data).get('name', {}).values())
+    except (TypeError, ValueError, AttributeError):
+        return []
+
+
+# Affinity triples for every recorded progress entry
+def _progress_events(conn):
+    from database import PLAN_DATA, PLAN_DATA_JOIN
+    rows = conn.execute(f'''
+        SELECT p.user_id, p.completed, p.feedback, {PLAN_DATA} AS data
+        FROM progress p
+        JOIN workout_plans w ON p.plan_id = w.id
+        {PLAN_DATA_JOIN}
+    ''').fetchall()
+    for row in rows:
+        names = plan_exercise_names(row['data'])
+        if names:
+            yield row['user_id'], names, progress_weight(row['completed'], row['feedback'])
+    # Progress rolled up by maintenance.py retention keeps its per-exercise sums
+    for row in conn.execute('SELECT user_id, affinities FROM progress_summaries WHERE affinities IS NOT NULL'):
+        for name, weight in json.loads(row['affinities']).items():
+            yield row['user_id'], (name,), weight
+
+
+def build_engine(conn=None, catalog=None):
+    from database import get_db_connection, flush_writes
+    flush_writes()
+    engine = RankingEngine(catalog if catalog is not None else read_catalog())
+    close = conn is None
+    conn = conn or get_db_connection()
+    try:
+        sums = defaultdict(float)
+        for user_id, names, weight in _progress_events(conn):
+            for name in names:
+                column = engine.exercise_index.get(name)
+                if column is not None:
+                    sums[(user_id, column)] += weight
+    finally:
+        if close:
+            conn.close()
+    if sums:
+        keys = list(sums)
+        engine.load_arrays([k[0] for k in keys], [k[1] for k in keys], list(sums.values()))
+    return engine
+
+
+_engine = None
+_building = False
+# Set when progress is recorded during a build, which may have missed it
+_stale = False
+# time.monotonic() of the last finished (or failed) build
+_built_at = 0.0
+_engine_lock = threading.Lock()
+
+
+def _build_in_background():
+    global _engine, _building, _stale, _built_at
+    while True:
+        with _engine_lock:
+            _stale = False
+        try:
+            engine = build_engine()
+        except Exception as e:
+            logger.warning("Ranking engine build failed: %s", e)
+            with _engine_lock:
+                _building = False
+                _built_at = time.monotonic()
+            return
+        with _engine_lock:
+            _engine = engine
+            _built_at = time.monotonic()
+            if not _stale:
+                _building = False
+                return
+
+
+def _refresh_due():
+    return RANKING_REFRESH_SECONDS > 0 and time.monotonic() - _built_at >= RANKING_REFRESH_SECONDS
+
+
+# Process-wide engine, built from the progress table in a background thread and
+# rebuilt every RANKING_REFRESH_SECONDS. Returns None until the first build
+# finishes; during a refresh the previous engine keeps serving.
+def get_engine():
+    global _building
+    if _engine is None or _refresh_due():
+        with _engine_lock:
+            if (_engine is None or _refresh_due()) and not _building:
+                _building = True
+                threading.Thread(target=_build_in_background, name='ranking-engine', daemon=True).start()
+    return _engine
+
+
+def has_history(user_id):
+    if user_id is None:
+        return False
+    engine = get_engine()
+    return engine is not None and engine.has_history(user_id)
+
+
+# Ranked catalog rows for these moods and this user (once has_history() is true)
+def rank_workouts(moods, user_id=None, limit=20):
+    engine = get_engine()
+    return engine.catalog.iloc[engine.rank(moods, user_id, limit)]
+
+
+# Fold a new progress entry into this process's engine. Called by
+# database.save_progress; exercise names are read from the saved plan if not given.
+# Other processes see the entry after their next refresh.
+def record_progress(user_id, plan_id, completed, feedback, exercise_names=None):
+    global _stale
+    with _engine_lock:
+        engine = _engine
+        if _building:
+            _stale = True
+    if engine is None:
+        # The build reads the progress table, so it picks this entry up itself
+        return
+    if exercise_names is None:
+        from database import PLAN_SELECT, get_db_connection
+        conn = get_db_connection()
+        try:
+            row = conn.execute(PLAN_SELECT + ' WHERE w.id = ?', (plan_id,)).fetchone()
+        finally:
+            conn.close()
+        exercise_names = plan_exercise_names(row['data']) if row is not None else []
+    engine.update(user_id, list(exercise_names), progress_weight(completed, feedback))
@@ -0,0 +1,74 @@
+from functools import lru_cache
+import pandas as pd
+from workout_catalog import read_catalog, duration_catalog
+import plan_pool
+import ranking
+
+# Workout plan recommenders shared by the Streamlit pages and offline tools
+# (batch_emotion.py, benchmark.py); importing this module has no side effects.
+
+
+# Duration catalog, read once per process
+@lru_cache(maxsize=1)
+def duration_workouts():
+    return duration_catalog()
+
+# Recommend workouts based on emotions (ranked by the user's progress history when there is one)
+def recommend_workouts(detected_emotions, user_id=None):
+    if ranking.has_history(user_id):
+        ranked = ranking.rank_workouts(detected_emotions, user_id)
+        return ranked[['Exercise', 'Sets', 'Video_Link', 'Duration']].to_dict('records')
+    df = read_catalog()
+    recommended = []
+    for emotion in detected_emotions:
+        emotion = emotion.lower().strip()
+        mood_df = df[df['Mood'].apply(lambda tags: emotion in tags)]
+        for _, row in mood_df.iterrows():
+            workout = {
+                'Exercise': row['Exercise'],
+                'Sets': row['Sets'],
+                'Video_Link': row['Video_Link'],
+                'Duration': row['Duration']
+            }
+            recommended.append(workout)
+    return recommended[:20]
+
+# Emotion plan (name/type/link/duration) for detected moods. Users with progress
+# history get a personalized ranking instead of a pooled plan.
+def emotion_plan(detected_emotions, user_id=None):
+    recommended_workouts = None
+    if not ranking.has_history(user_id):
+        recommended_workouts = plan_pool.emotion_plan(detected_emotions, user_id)
+    if recommended_workouts is None:
+        recommended_workouts = pd.DataFrame(recommend_workouts(detected_emotions, user_id)).rename(columns={
+            'Exercise': 'name',
+            'Sets': 'type',
+            'Video_Link': 'link',
+            'Duration': 'duration'
+        })
+    return recommended_workouts
+
+# Duration plan from the pool, computed directly while the pool is still building
+def duration_plan(target_duration, user_id=None):
+    recommended_workouts = plan_pool.duration_plan(target_duration, user_id)
+    if recommended_workouts is None:
+        recommended_workouts = recommend_workouts_by_duration(target_duration)
+    return recommended_workouts
+
+# Recommend workouts by duration
+def recommend_workouts_by_duration(target_duration):
+    selected = pd.DataFrame()
+    remaining_time = target_duration
+    available_workouts = duration_workouts().copy()
+    while remaining_time > 0 and not available_workouts.empty:
+        workout = available_workouts.sample(n=1)
+        workout_duration = workout['duration'].iloc[0]
+        if workout_duration <= remaining_time:
+            selected = pd.concat([selected, workout], ignore_index=True)
+            remaining_time -= workout_duration
+        available_workouts = available_workouts.drop(workout.index)
+    total_duration = selected['duration'].sum()
+    while total_duration > target_duration and not selected.empty:
+        selected = selected.iloc[:-1]
+        total_duration = selected['duration'].sum()
+    return selected.reset_index(drop=True)
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# database runs init_db() on import; keep it away from the real users.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='wellness-tests-'), 'users.db')
+
+import database  # noqa: E402
+
+
+# Fresh database in a temporary DB_PATH, with this process's plan id block reset
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'users.db'))
+    monkeypatch.setattr(database, '_id_block', [0, 0])
+    database.init_db()
+    yield database
+    database.flush_writes()
@@ -0,0 +1,76 @@
+import gzip
+import http.client
+import queue
+import threading
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import plan_server
+
+
+@pytest.fixture
+def server(db, monkeypatch):
+    monkeypatch.setattr(plan_server, '_connections', queue.LifoQueue())
+    monkeypatch.setattr(plan_server, '_cache', plan_server.LRUCache(16))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), plan_server.PlanRequestHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(port, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def _save_plan(db, user_id=1):
+    workouts = pd.DataFrame([{'name': 'Jumping Jacks', 'type': '3 sets of 20', 'link': '', 'duration': 3}])
+    return db.save_workout_plan(user_id, 'duration', workouts)
+
+
+def test_unshared_plan_is_not_served(db, server):
+    plan_id = _save_plan(db)
+    assert get(server, f'/plan/{plan_id}')[0] == 404
+    assert get(server, '/plan/' + 'A' * 22)[0] == 404
+
+
+def test_shared_plan_is_served_until_unshared(db, server):
+    plan_id = _save_plan(db)
+    assert db.share_workout_plan(2, plan_id) is None
+    token = db.share_workout_plan(1, plan_id)
+    assert token and db.share_workout_plan(1, plan_id) == token
+
+    status, headers, body = get(server, f'/plan/{token}')
+    assert status == 200 and b'Jumping Jacks' in body
+    assert get(server, f'/plan/{token[:-1]}')[0] == 404
+    assert get(server, f'/plan/{plan_id}')[0] == 404
+
+    db.unshare_workout_plan(1, plan_id)
+    status, headers, _ = get(server, f'/plan/{token}')
+    assert status == 404 and headers['Cache-Control'] == 'no-store'
+
+
+@pytest.mark.parametrize('accept_encoding, gzipped', [
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0, *', False),
+    ('x-gzip-foo', False),
+    ('identity', False),
+    ('', False),
+])
+def test_gzip_only_when_accepted(db, server, accept_encoding, gzipped):
+    token = db.share_workout_plan(1, _save_plan(db))
+    status, headers, body = get(server, f'/plan/{token}', {'Accept-Encoding': accept_encoding})
+    assert status == 200
+    assert (headers.get('Content-Encoding') == 'gzip') == gzipped
+    assert b'Jumping Jacks' in (gzip.decompress(body) if gzipped else body)
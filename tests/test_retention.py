@@ -0,0 +1,153 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import database
+import maintenance
+import ranking
+from workout_catalog import read_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOW = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return read_catalog(os.path.join(ROOT, 'mood_based_workouts_updated.csv'))
+
+
+def _timestamp(days_ago, hour=12):
+    return (NOW - timedelta(days=days_ago)).replace(hour=hour).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _save_plan(db, catalog, user_id, rows, days_ago):
+    workouts = catalog.iloc[rows][['Exercise', 'Sets', 'Video_Link', 'Duration']].rename(
+        columns={'Exercise': 'name', 'Sets': 'type', 'Video_Link': 'link', 'Duration': 'duration'})
+    plan_id = db.save_workout_plan(user_id, 'emotion', workouts)
+    db.flush_writes()
+    conn = db.get_db_connection()
+    conn.execute('UPDATE workout_plans SET created_at = ? WHERE id = ?', (_timestamp(days_ago), plan_id))
+    conn.commit()
+    conn.close()
+    return plan_id
+
+
+def _add_progress(db, user_id, plan_id, days_ago, completed, feedback=None, hour=12):
+    conn = db.get_db_connection()
+    conn.execute('INSERT INTO progress (user_id, plan_id, completed, feedback, completed_at) VALUES (?, ?, ?, ?, ?)',
+                 (user_id, plan_id, completed, feedback, _timestamp(days_ago, hour)))
+    conn.commit()
+    conn.close()
+
+
+def _stats(db, user_id):
+    return db.progress_stats(db.get_progress(user_id), db.get_progress_summaries(user_id))
+
+
+def _affinity(engine, user_id):
+    sums = {}
+    for column, value in zip(*engine.user_affinity(user_id)):
+        sums[int(column)] = sums.get(int(column), 0.0) + float(value)
+    return sums
+
+
+def _retention(capsys, *args):
+    assert maintenance.main(['retention', '--older-than-days', '30'] + list(args)) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.fixture
+def history(db, catalog):
+    plans = {
+        'a': _save_plan(db, catalog, 1, [0, 1, 2], 60),
+        'b': _save_plan(db, catalog, 1, [2, 3, 4], 45),
+        'c': _save_plan(db, catalog, 2, [5, 6], 90),
+        'd': _save_plan(db, catalog, 1, [0, 7], 5),
+    }
+    # User 1: completed every day from 40 to 25 days ago, so the streak crosses the
+    # 30-day cutoff; some days have several entries, one of them not completed
+    for days_ago in range(40, 24, -1):
+        _add_progress(db, 1, plans['a'] if days_ago > 35 else plans['b'], days_ago, True, 'great fun', hour=9)
+        if days_ago % 3 == 0:
+            _add_progress(db, 1, plans['b'], days_ago, days_ago % 2 == 0, 'too hard', hour=18)
+    _add_progress(db, 1, plans['a'], 70, False, 'boring')
+    # User 2: everything gets summarized; their last day was not completed
+    for days_ago in (95, 94, 93):
+        _add_progress(db, 2, plans['c'], days_ago, True, 'love it')
+    _add_progress(db, 2, plans['c'], 92, False)
+    # User 3: a streak that ends in the summarized months
+    for days_ago in (52, 51, 50):
+        _add_progress(db, 3, plans['b'], days_ago, True)
+    return plans
+
+
+def test_retention_keeps_ranking_and_streaks(db, catalog, history, capsys):
+    users = (1, 2, 3)
+    before_engine = ranking.build_engine(catalog=catalog)
+    before = {user: (_affinity(before_engine, user), list(before_engine.rank(['happy', 'sad'], user)), _stats(db, user))
+              for user in users}
+    assert before[1][2] == (18, 16)
+    assert before[2][2] == (3, 0)
+    assert before[3][2] == (3, 3)
+
+    report = _retention(capsys)
+    assert report['rows_summarized'] > 0 and report['contents_archived'] > 0
+    conn = db.get_db_connection()
+    assert conn.execute('SELECT COUNT(*) FROM progress WHERE user_id IN (2, 3)').fetchone()[0] == 0
+    conn.close()
+
+    after_engine = ranking.build_engine(catalog=catalog)
+    for user in users:
+        affinity, ranked, stats = before[user]
+        after_affinity = _affinity(after_engine, user)
+        assert after_affinity.keys() == affinity.keys()
+        assert np.allclose([after_affinity[k] for k in affinity], list(affinity.values()))
+        assert list(after_engine.rank(['happy', 'sad'], user)) == ranked
+        assert _stats(db, user) == stats
+    assert np.allclose(after_engine.popularity, before_engine.popularity)
+
+
+# Running retention twice must not count summarized rows again
+def test_retention_is_idempotent(db, history, capsys):
+    _retention(capsys)
+    stats = {user: _stats(db, user) for user in (1, 2, 3)}
+    assert _retention(capsys)['rows_summarized'] == 0
+    assert {user: _stats(db, user) for user in (1, 2, 3)} == stats
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE legacy (x)')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    monkeypatch.setattr(maintenance, 'DB_PATH', path)
+    database.init_db()
+    return path
+
+
+def _auto_vacuum(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    finally:
+        conn.close()
+
+
+# An older database is only rewritten with a full VACUUM when asked to
+def test_retention_skips_full_vacuum_unless_converting(legacy_db, capsys):
+    assert _auto_vacuum(legacy_db) == 0
+    report = _retention(capsys)
+    assert 'vacuum_skipped' in report and 'vacuumed_bytes' not in report
+    assert _auto_vacuum(legacy_db) == 0
+
+    report = _retention(capsys, '--convert')
+    assert 'vacuumed_bytes' in report
+    assert _auto_vacuum(legacy_db) == 2
+    assert 'vacuum_skipped' not in _retention(capsys)
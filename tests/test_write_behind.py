@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pandas as pd
+import pytest
+
+import database
+import write_behind
+from write_behind import WriteBehindQueue
+
+
+def _insert_note(conn, note_id, text):
+    conn.execute('INSERT INTO notes (id, text) VALUES (?, ?)', (note_id, text))
+
+
+def _notes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute('SELECT id, text FROM notes').fetchall())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def notes_db(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def writer(notes_db):
+    return WriteBehindQueue(lambda: sqlite3.connect(notes_db, check_same_thread=False))
+
+
+@pytest.mark.parametrize('durability', ['sync', 'commit'])
+def test_failing_write_raises_to_its_caller(monkeypatch, writer, notes_db, durability):
+    monkeypatch.setattr(write_behind, 'WRITE_DURABILITY', durability)
+    writer.submit(_insert_note, 1, 'first')
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.submit(_insert_note, 1, 'duplicate id')
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.submit(_insert_note, 2, None)
+    assert writer.failed_writes == 2
+    assert _notes(notes_db) == {1: 'first'}
+
+
+# A bad write in a batch fails on its own; the other writes of the batch still commit
+def test_failed_batch_falls_back_to_single_writes(monkeypatch, writer, notes_db):
+    monkeypatch.setattr(write_behind, 'WRITE_DURABILITY', 'commit')
+    entered, release = threading.Event(), threading.Event()
+
+    # Holds the writer inside a transaction so the next writes queue up as one batch
+    def blocking_insert(conn, note_id, text):
+        entered.set()
+        release.wait(5)
+        _insert_note(conn, note_id, text)
+
+    results = {}
+
+    def submit(key, func, *args):
+        try:
+            writer.submit(func, *args)
+            results[key] = 'ok'
+        except Exception as e:
+            results[key] = e
+
+    threads = [threading.Thread(target=submit, args=('blocker', blocking_insert, 1, 'blocker'))]
+    threads[0].start()
+    assert entered.wait(5)
+    for key, args in (('good-2', (2, 'two')), ('bad', (1, 'duplicate')), ('good-3', (3, 'three'))):
+        threads.append(threading.Thread(target=submit, args=(key, _insert_note) + args))
+        threads[-1].start()
+    while writer.queue.qsize() < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert results['blocker'] == 'ok'
+    assert results['good-2'] == 'ok' and results['good-3'] == 'ok'
+    assert isinstance(results['bad'], sqlite3.IntegrityError)
+    assert _notes(notes_db) == {1: 'blocker', 2: 'two', 3: 'three'}
+    assert writer.failed_writes == 1
+
+
+# When committing itself breaks mid-batch, no waiting caller is told its write succeeded
+def test_crash_mid_batch_is_not_reported_as_success(monkeypatch, notes_db):
+    monkeypatch.setattr(write_behind, 'WRITE_DURABILITY', 'commit')
+    monkeypatch.setattr(write_behind, 'WRITE_RETRIES', 1)
+
+    class Crash(Exception):
+        pass
+
+    def crashing_connect():
+        raise Crash("database went away")
+
+    writer = WriteBehindQueue(crashing_connect)
+    errors = []
+
+    def submit(note_id):
+        try:
+            writer.submit(_insert_note, note_id, 'lost')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(errors) == 5 and all(isinstance(e, Crash) for e in errors)
+    assert writer.failed_writes == 5
+    assert _notes(notes_db) == {}
+
+
+def test_async_writes_are_counted_when_they_fail(monkeypatch, writer, notes_db):
+    monkeypatch.setattr(write_behind, 'WRITE_DURABILITY', 'async')
+    writer.submit(_insert_note, 1, 'kept')
+    writer.submit(_insert_note, 1, 'duplicate')
+    assert writer.flush(5)
+    assert writer.failed_writes == 1
+    assert _notes(notes_db) == {1: 'kept'}
+
+
+# A forked child must not inherit (and later replay) the parent's queued writes
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs os.fork")
+def test_fork_starts_with_an_empty_queue(monkeypatch, writer, notes_db):
+    monkeypatch.setattr(write_behind, 'WRITE_DURABILITY', 'commit')
+    writer.submit(_insert_note, 1, 'parent')
+    writer.queue.put(write_behind.PendingWrite(_insert_note, (2, 'stranded'), False))
+    os.register_at_fork(after_in_child=writer.reset)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = writer.queue.qsize() == 0 and writer.thread is None
+            writer.submit(_insert_note, 3, 'child')
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert writer.flush(5)
+    assert _notes(notes_db) == {1: 'parent', 2: 'stranded', 3: 'child'}
+
+
+# Async writes still queued at interpreter exit are committed by the atexit flush
+def test_async_writes_are_flushed_at_exit(tmp_path):
+    path = str(tmp_path / 'users.db')
+    script = textwrap.dedent('''
+        import database
+        database.init_db()
+        database.save_progress(1, None, True, 'queued at exit')
+    ''')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DB_PATH=path, WRITE_DURABILITY='async', WRITE_MAX_DELAY_MS='60000',
+               PYTHONPATH=root)
+    subprocess.run([sys.executable, '-c', script], check=True, env=env, cwd=root, timeout=120)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('SELECT feedback FROM progress').fetchall() == [('queued at exit',)]
+    finally:
+        conn.close()
+
+
+def _plan(name):
+    return pd.DataFrame([{'name': name, 'type': '3 sets', 'link': '', 'duration': 3}])
+
+
+def test_saved_plan_ids_are_unique_and_readable(db):
+    ids = [db.save_workout_plan(1, 'emotion', _plan(f'exercise {i}')) for i in range(7)]
+    assert len(set(ids)) == len(ids)
+    plans = db.get_workout_plans(1)
+    assert sorted(plan['id'] for plan in plans) == sorted(ids)
+
+
+# Id blocks reserved by different processes never overlap, and never reuse ids already in the table
+def test_id_blocks_do_not_overlap(db, monkeypatch):
+    monkeypatch.setattr(db, 'WRITE_ID_BLOCK', 5)
+    first = db.save_workout_plan(1, 'emotion', _plan('a'))
+    # Another process reserving its block
+    other_start, other_end = db._reserve_ids('workout_plans', 5)
+    assert other_start >= first + 5
+    conn = db.get_db_connection()
+    conn.execute("INSERT INTO workout_plans (id, user_id, type, data) VALUES (?, 2, 'legacy', '{}')", (other_end + 100,))
+    conn.commit()
+    conn.close()
+    # This process's block runs out and the next one starts past every used id
+    ids = [db.save_workout_plan(1, 'emotion', _plan(f'b{i}')) for i in range(5)]
+    assert all(i < other_start or i > other_end + 100 for i in ids)
+    assert len(set(ids + [first])) == 6
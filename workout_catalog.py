@@ -0,0 +1,40 @@
+import os
+import pandas as pd
+
+# Workout catalog shared by the Streamlit pages, the plan pools and offline tools
+CATALOG_PATH = "mood_based_workouts_updated.csv"
+
+
+# Raw catalog with Mood parsed from "['Neutral', 'Fear']" into lowercase tag lists
+def read_catalog(path=CATALOG_PATH):
+    df = pd.read_csv(path)
+    df['Mood'] = df['Mood'].str.replace(r"[\[\]']", "", regex=True).str.lower().str.split(',').apply(
+        lambda tags: [tag.strip() for tag in tags]
+    )
+    return df
+
+
+# Minutes a duration-based plan budgets for an exercise
+def estimate_duration(name, sets):
+    name = name.lower()
+    if any(x in name for x in ['sprint', 'hiit', 'battle rope', 'rowing']):
+        return 5
+    if any(x in name for x in ['plank', 'side plank']) or 'sec' in sets:
+        return 2
+    return 3
+
+
+# Catalog in the name/type/link/duration shape the plan cards use
+def duration_catalog(path=CATALOG_PATH):
+    df = pd.read_csv(path)
+    df['type'] = df['Sets']
+    df['name'] = df['Exercise']
+    df['link'] = df['Video_Link']
+    df['duration'] = [estimate_duration(name, sets) for name, sets in zip(df['name'], df['type'])]
+    return df[['name', 'type', 'link', 'duration']]
+
+
+# Changes whenever the catalog file is edited or replaced
+def catalog_fingerprint(path=CATALOG_PATH):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
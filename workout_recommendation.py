@@ -1,36 +1,53 @@
 import numpy as np
 import streamlit as st
-import cv2
 import pandas as pd
 from collections import Counter
-from deepface import DeepFace
 import smtplib
+import io
+from html import escape
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 import time
-from database import save_workout_plan, get_workout_plans, save_progress, get_progress
+from database import save_workout_plan, get_workout_plans, save_progress, get_progress, get_face_embedding
+from database import save_mood_result, get_mood_result, get_progress_summaries, progress_stats
+from database import share_workout_plan, unshare_workout_plan
+from metrics import timed
+from camera import open_camera
+from camera_preview import CameraPreview
+from face_models import FACE_MODEL
+from group_session import GroupSession
+from emotion_analysis import EmotionAccumulator
+from inference_backend import get_backend
+from workout_catalog import duration_catalog
+from recommendations import recommend_workouts, emotion_plan, duration_plan, recommend_workouts_by_duration
+import plan_pool
+import plan_prefetch
+from plan_render import render_plan_html, workout_cards_html, history_card_html, cached_html
+from plan_server import plan_url
+import ranking
 
 # Load environment variables
 load_dotenv()
 SENDER_EMAIL = os.getenv('SMTP_EMAIL')
 SENDER_PASSWORD = os.getenv('SMTP_PASSWORD')
+# Outgoing mail server (a local sink during load tests)
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') == '1'
+# Reuse a user's last emotion scan for this many seconds unless they ask to rescan
+MOOD_CACHE_TTL = float(os.getenv('MOOD_CACHE_TTL', '900'))
+MOOD_CACHE_MIN_CONFIDENCE = float(os.getenv('MOOD_CACHE_MIN_CONFIDENCE', '0'))
+# Card lists are sent as one element; longer lists are split into pages
+CARD_PAGE_SIZE = int(os.getenv('CARD_PAGE_SIZE', '25'))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
 
 # Load workout dataset
 @st.cache_data
 def load_workout_data():
     try:
-        df = pd.read_csv("mood_based_workouts_updated.csv")  # Ensure file exists or provide path
-        df['type'] = df['Sets']
-        df['name'] = df['Exercise']
-        df['link'] = df['Video_Link']
-        df['duration'] = df.apply(lambda row: (
-            5 if any(x in row['name'].lower() for x in ['sprint', 'hiit', 'battle rope', 'rowing'])
-            else 2 if any(x in row['name'].lower() for x in ['plank', 'side plank']) or 'sec' in row['type']
-            else 3
-        ), axis=1)
-        return df[['name', 'type', 'link', 'duration']]
+        return duration_catalog()
     except FileNotFoundError:
         st.error("Workout dataset not found. Please ensure 'mood_based_workouts_updated.csv' exists.")
         return pd.DataFrame()
@@ -39,21 +56,28 @@ df = load_workout_data()
 if df.empty:
     st.stop()
 
+# Start building the precomputed plan pools and the ranking engine in the background
+plan_pool.get_pool()
+ranking.get_engine()
+
 # Function to send email
 def send_email(to_email, subject, content):
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
+    smtp_server = SMTP_HOST
+    smtp_port = SMTP_PORT
     msg = MIMEMultipart()
     msg['From'] = SENDER_EMAIL
     msg['To'] = to_email
     msg['Subject'] = subject
     msg.attach(MIMEText(content, 'html'))
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
-        server.quit()
+        with timed('email_send'):
+            server = smtplib.SMTP(smtp_server, smtp_port)
+            if SMTP_STARTTLS:
+                server.starttls()
+            if SENDER_PASSWORD:
+                server.login(SENDER_EMAIL, SENDER_PASSWORD)
+            server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
+            server.quit()
         return True
     except Exception as e:
         st.error(f"Failed to send email: {str(e)}")
@@ -61,206 +85,22 @@ def send_email(to_email, subject, content):
 
 # Colorful, professional email template
 def generate_email_template(subject, username, plan_id, workouts, duration_info=None, emotions=None):
-    # Theme settings
-    primary_color = '#C0392B'  # Vibrant red
-    secondary_color = '#000000'  # Pure black
-    accent_color = '#FFFFFF'  # White
-    background_color = '#1C2526'  # Dark charcoal
-    font_heading = 'Poppins'
-    font_body = 'Roboto'
-
-    # Dynamic content
-    title = subject
     intro_text = f"Hello {username},"
     if emotions:
         body_text = f"Your workout plan, tailored to your emotions ({', '.join(emotions)}), is ready to energize your day!"
     else:
         body_text = f"Your {duration_info}-minute workout plan (actual duration: {workouts['duration'].sum()} minutes) is set to boost your fitness!"
 
-    content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@600&family=Roboto:wght@400;500&display=swap" rel="stylesheet">
-    <style>
-        body {{
-            margin: 0;
-            padding: 0;
-            font-family: '{font_body}', 'Helvetica', 'Arial', sans-serif;
-            background-color: {background_color};
-            color: #FFFFFF;
-        }}
-        .outer-container {{
-            width: 100%;
-            background: {background_color};
-            padding: 20px 0;
-        }}
-        .inner-container {{
-            max-width: 900px;
-            margin: 0 auto;
-            background: #2D2D2D;
-            border-radius: 10px;
-            border: 2px solid {primary_color};
-        }}
-        .header {{
-            padding: 0;
-            text-align: center;
-            background: {secondary_color};
-        }}
-        .header img {{
-            width: 100%;
-            height: auto;
-            border-radius: 10px 10px 0 0;
-            display: block;
-        }}
-        .content {{
-            padding: 35px;
-        }}
-        h1 {{
-            font-family: '{font_heading}', 'Helvetica', sans-serif;
-            color: {primary_color};
-            font-size: 26px;
-            margin: 0 0 20px;
-            text-align: center;
-            font-weight: 500;
-        }}
-        p {{
-            font-size: 16px;
-            line-height: 1.6;
-            margin: 0 0 15px;
-            color: #D3D3D3;
-        }}
-        ul {{
-            list-style: none;
-            padding: 0;
-            margin: 0 0 25px;
-        }}
-        li {{
-            font-size: 18px;
-            margin: 15px 0;
-            display: block;
-        }}
-        li span {{
-            color: {accent_color}; /* Match numbers to white text */
-            margin-right: 10px;
-        }}
-        a {{
-            color: {accent_color}; /* White links */
-            text-decoration: none;
-            font-weight: 500;
-        }}
-        a:hover {{
-            text-decoration: underline;
-        }}
-        .button {{
-            display: inline-block;
-            padding: 12px 30px;
-            background: {primary_color};
-            color: {accent_color};
-            text-align: center;
-            border-radius: 5px;
-            font-size: 16px;
-            font-weight: 500;
-            margin: 20px auto;
-            display: block;
-            width: fit-content;
-            text-decoration: none;
-            transition: background 0.3s ease;
-        }}
-        .button:hover {{
-            background: #E74C3C;
-        }}
-        .footer {{
-            background: {secondary_color};
-            padding: 20px;
-            text-align: center;
-            font-size: 12px;
-            color: #D3D3D3;
-            border-top: 2px solid {primary_color};
-            border-radius: 0 0 10px 10px;
-        }}
-        .footer a {{
-            color: #E74C3C;
-            text-decoration: none;
-            font-weight: 500;
-        }}
-        .footer a:hover {{
-            text-decoration: underline;
-        }}
-        @media only screen and (max-width: 900px) {{
-            .inner-container {{
-                max-width: 95%;
-                margin: 0 auto;
-            }}
-            .content {{
-                padding: 20px;
-            }}
-            h1 {{
-                font-size: 22px;
-            }}
-            p, li {{
-                font-size: 16px;
-            }}
-            .button {{
-                padding: 10px 25px;
-                font-size: 14px;
-            }}
-            .header img {{
-                border-radius: 8px 8px 0 0;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <table class="outer-container" width="100%" cellpadding="0" cellspacing="0">
-        <tr>
-            <td>
-                <table class="inner-container" width="100%" cellpadding="0" cellspacing="0">
-                    <tr>
-                        <td class="header">
-                            <img src="https://images.unsplash.com/photo-1593079831268-3381b0db4a77?ixlib=rb-4.0.3&auto=format&fit=crop&w=800&q=80" alt="Fitness Header" />
-                        </td>
-                    </tr>
-                    <tr>
-                        <td class="content">
-                            <h1>{title}</h1>
-                            <p>{intro_text}</p>
-                            <p>{body_text}</p>
-                            <ul>
-                                {''.join([f"""
-                                <li>
-                                    <span>{index + 1}.</span> <a href='{row['link']}'>{row['name']} ({row['type']}) - {row['duration']} min</a>
-                                </li>
-                                """ for index, (_, row) in enumerate(workouts.iterrows())])}
-                            </ul>
-                            <span class="button">Start Your Workout</span>
-                        </td>
-                    </tr>
-                    <tr>
-                        <td class="footer">
-                            <p>Created by Kevin Mevada</p>
-                            <p><a href="https://github.com/kevinmevada">GitHub</a> | <a href="https://linkedin.com/in/kevinmevada">LinkedIn</a></p>
-                            <p>© 2025 Emotion Powered Wellness and Fitness Guide Companion. All Rights Reserved.</p>
-                        </td>
-                    </tr>
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-"""
+    content = render_plan_html(subject, intro_text, body_text, workouts)
     # Save for debugging
     with open("email_content.html", "w", encoding="utf-8") as f:
         f.write(content)
     return content
 
-# Emotion detection with DeepFace
+# Emotion detection with the configured inference backend
 def detect_emotion():
-    emotions = []
-    cap = cv2.VideoCapture(0)
+    accumulator = EmotionAccumulator()
+    cap = open_camera()
     if not cap.isOpened():
         st.error("No webcam detected. Please connect a webcam and try again.")
         return []
@@ -268,59 +108,60 @@ def detect_emotion():
     start_time = time.time()
     with st.spinner("Detecting emotions..."):
         while time.time() - start_time < timeout:
-            ret, frame = cap.read()
+            with timed('camera_read'):
+                ret, frame = cap.read()
             if not ret:
                 st.error("Failed to capture video. Please check your webcam.")
                 break
             try:
-                result = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=True)
-                emotion = result[0]['dominant_emotion'].capitalize()
-                if emotion in ['Happy', 'Sad', 'Angry', 'Neutral']:
-                    emotions.append(emotion)
+                with timed('deepface_analyze'):
+                    result = get_backend().analyze_emotion(frame, enforce_detection=True)
+                accumulator.add(result[0]['emotion'])
             except Exception as e:
                 st.warning(f"Emotion detection error: {e}")
                 pass
-            if len(emotions) >= 10:
+            # Stop as soon as the smoothed moods are clearly separated
+            if accumulator.done():
                 break
     cap.release()
-    cv2.destroyAllWindows()
-    return list(dict.fromkeys(emotions))[:3]
+    st.session_state['emotion_scan_stats'] = {
+        'frames': accumulator.frames,
+        'confidence': accumulator.confidence(),
+        'probabilities': accumulator.probabilities(),
+    }
+    return accumulator.top_moods()
+
+# Row range of the page picked for a list, with a page selector when it does not fit on one
+def _page_bounds(total, page_size, key):
+    if page_size <= 0 or total <= page_size:
+        return 0, total
+    pages = (total + page_size - 1) // page_size
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=f'{key}_page')
+    start = (page - 1) * page_size
+    return start, min(total, start + page_size)
 
-# Recommend workouts based on emotions
-def recommend_workouts(detected_emotions):
-    df = pd.read_csv("mood_based_workouts_updated.csv")
-    df['Mood'] = df['Mood'].str.replace(r"[\[\]']", "", regex=True).str.strip().str.lower()
-    recommended = []
-    for emotion in detected_emotions:
-        emotion = emotion.lower().strip()
-        mood_df = df[df['Mood'] == emotion]
-        for _, row in mood_df.iterrows():
-            workout = {
-                'Exercise': row['Exercise'],
-                'Sets': row['Sets'],
-                'Video_Link': row['Video_Link'],
-                'Duration': row['Duration']
-            }
-            recommended.append(workout)
-    return recommended[:20]
+# A plan's workout cards as a single markdown element, cached when the plan is saved
+def show_workout_cards(workouts, plan_id, key):
+    start, end = _page_bounds(len(workouts), CARD_PAGE_SIZE, key)
+    html = cached_html(f'cards:{start}:{end}', plan_id, lambda: workout_cards_html(workouts.iloc[start:end]))
+    st.markdown(html, unsafe_allow_html=True)
 
-# Recommend workouts by duration
-def recommend_workouts_by_duration(target_duration):
-    selected = pd.DataFrame()
-    remaining_time = target_duration
-    available_workouts = df.copy()
-    while remaining_time > 0 and not available_workouts.empty:
-        workout = available_workouts.sample(n=1)
-        workout_duration = workout['duration'].iloc[0]
-        if workout_duration <= remaining_time:
-            selected = pd.concat([selected, workout], ignore_index=True)
-            remaining_time -= workout_duration
-        available_workouts = available_workouts.drop(workout.index)
-    total_duration = selected['duration'].sum()
-    while total_duration > target_duration and not selected.empty:
-        selected = selected.iloc[:-1]
-        total_duration = selected['duration'].sum()
-    return selected.reset_index(drop=True)
+# Workout History cards for saved plan rows; cached cards skip parsing the plan JSON entirely
+def history_cards_html(plans):
+    return ''.join(cached_html('history', plan['id'], lambda plan=plan: history_card_html(
+        plan['type'], plan['created_at'], pd.read_json(io.StringIO(plan['data'])))) for plan in plans)
+
+# Share link buttons for a saved plan; only the plan's owner can share or unshare it
+def share_controls(user_id, plan_id, key):
+    if st.button("Share Plan", key=f'share_{key}'):
+        share_token = share_workout_plan(user_id, plan_id)
+        if share_token:
+            st.code(plan_url(share_token))
+        else:
+            st.warning("Only your own saved plans can be shared.")
+    if st.button("Stop Sharing", key=f'unshare_{key}'):
+        unshare_workout_plan(user_id, plan_id)
+        st.info("The share link for this plan no longer works.")
 
 # Emotion-based workout recommendation
 def workout_recommendation():
@@ -361,20 +202,36 @@ def workout_recommendation():
         st.markdown("<h1>Emotion-Based Workouts</h1>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("<div class='button-container'>", unsafe_allow_html=True)
-        if st.button('Scan Emotions', key='emotion_button'):
-            detected_emotions = detect_emotion()
+        scan = st.button('Scan Emotions', key='emotion_button')
+        rescan = st.button('Rescan', key='emotion_rescan')
+        if scan or rescan:
+            user_id = st.session_state.get('user_id')
+            # A recent scan is reused (no camera) unless the user asked for a fresh one
+            cached = get_mood_result(user_id, MOOD_CACHE_TTL) if user_id and not rescan else None
+            if cached and cached['confidence'] >= MOOD_CACHE_MIN_CONFIDENCE:
+                detected_emotions = cached['moods']
+                st.session_state['emotion_scan_stats'] = {
+                    'frames': cached['frames'],
+                    'confidence': cached['confidence'],
+                    'probabilities': cached['probabilities'],
+                    'scanned_at': cached['scanned_at'],
+                }
+            else:
+                with timed('emotion_scan'):
+                    detected_emotions = detect_emotion()
+                scan_stats = st.session_state.get('emotion_scan_stats')
+                if user_id and detected_emotions and scan_stats:
+                    save_mood_result(user_id, detected_emotions, scan_stats['confidence'], scan_stats['frames'],
+                                     scan_stats['probabilities'])
             if detected_emotions:
                 st.success("Emotions detected!")
                 st.session_state['emotions_detected'] = True
                 st.session_state['detected_emotions'] = detected_emotions
-                recommended_workouts = recommend_workouts(detected_emotions)
-                st.session_state['emotion_recommended_workouts'] = pd.DataFrame(recommended_workouts).rename(columns={
-                    'Exercise': 'name',
-                    'Sets': 'type',
-                    'Video_Link': 'link',
-                    'Duration': 'duration'
-                })
-                user_id = st.session_state.get('user_id')
+                with timed('recommend_workouts'):
+                    recommended_workouts = emotion_plan(detected_emotions, user_id)
+                st.session_state['emotion_recommended_workouts'] = recommended_workouts
+                # Cleared when nothing is saved so cards and links never point at an older plan
+                st.session_state['emotion_plan_id'] = None
                 if user_id and not st.session_state['emotion_recommended_workouts'].empty:
                     st.session_state['emotion_plan_id'] = save_workout_plan(user_id, 'emotion', st.session_state['emotion_recommended_workouts'])
             else:
@@ -385,24 +242,24 @@ def workout_recommendation():
         recommended_workouts = st.session_state['emotion_recommended_workouts']
         detected_emotions = st.session_state.get('detected_emotions', [])
         st.markdown(f"<h3 style='text-align: center;'>Detected Emotions: {', '.join(detected_emotions)}</h3>", unsafe_allow_html=True)
+        scan_stats = st.session_state.get('emotion_scan_stats')
+        if scan_stats:
+            if scan_stats.get('scanned_at'):
+                minutes = max(0, int((time.time() - scan_stats['scanned_at']) // 60))
+                st.caption(f"Using your scan from {minutes} min ago ({scan_stats['frames']} frame(s), "
+                           f"confidence {scan_stats['confidence']:.0%}). Click Rescan for a fresh one.")
+            else:
+                st.caption(f"Based on {scan_stats['frames']} frame(s), confidence {scan_stats['confidence']:.0%}")
         st.markdown("<h3 style='text-align: center;'>Your Workout Plan</h3>", unsafe_allow_html=True)
         st.write("---")
-        for i, row in recommended_workouts.iterrows():
-            st.markdown(f"""
-                <div class='workout-card'>
-                    <h4><a href="{row['link']}" target="_blank">{i + 1}. {row['name']}</a></h4>
-                    <p>Sets: {row['type']}</p>
-                    <p>Duration: {row['duration']} min</p>
-                </div>
-            """, unsafe_allow_html=True)
+        show_workout_cards(recommended_workouts, st.session_state.get('emotion_plan_id'), 'emotion_cards')
 
         user_email = st.session_state.get('email')
         user_id = st.session_state.get('user_id')
         plan_id = st.session_state.get('emotion_plan_id')
         
         if user_id and plan_id:
-            if st.button("Share Plan", key='share_emotion'):
-                st.code(f"https://your-app-url.com/plan/{plan_id}")
+            share_controls(user_id, plan_id, 'emotion')
             
             if user_email and st.button("Email Plan", key='email_emotion'):
                 username = st.session_state.get('username', 'User')
@@ -425,13 +282,105 @@ def workout_recommendation():
             
             if st.button("Mark as Completed", key='complete_emotion'):
                 feedback = st.text_area("Optional feedback:", key='feedback_emotion')
-                save_progress(user_id, plan_id, True, feedback)
+                save_progress(user_id, plan_id, True, feedback, recommended_workouts['name'])
                 st.success("Workout marked as completed!")
 
+# Group scan: every face in each frame is analyzed in one pass and tracked across frames
+def scan_group(find_me):
+    # Faces are only ever compared with the logged-in user's own enrollment
+    user_id = st.session_state.get('user_id')
+    enrolled = None
+    if find_me and user_id:
+        embedding = get_face_embedding(user_id, FACE_MODEL)
+        if embedding is not None:
+            enrolled = [(user_id, st.session_state.get('username'), embedding)]
+    session = GroupSession(enrolled)
+    cap = open_camera()
+    if not cap.isOpened():
+        st.error("No webcam detected. Please connect a webcam and try again.")
+        return None
+    preview = CameraPreview(st.empty())
+    timeout = 20
+    start_time = time.time()
+    with st.spinner("Scanning the group..."):
+        while time.time() - start_time < timeout:
+            with timed('camera_read'):
+                ret, frame = cap.read()
+            if not ret:
+                st.error("Failed to capture video. Please check your webcam.")
+                break
+            preview.submit(frame)
+            session.process(frame)
+            if session.done():
+                break
+    preview.stop()
+    cap.release()
+    return session.summary()
+
+# Group session: per-person and class-wide moods with per-person or shared plans
+def group_workouts():
+    st.markdown("<h1 style='text-align: center;'>Group Session</h1>", unsafe_allow_html=True)
+    find_me = st.checkbox("Find me in the group", value=True, key='group_find_me')
+    plan_mode = st.radio("Plans", ["Shared class plan", "Per-person plans"], key='group_plan_mode')
+
+    if st.button("Scan Group", key='group_scan'):
+        with timed('group_scan'):
+            summary = scan_group(find_me)
+        st.session_state['group_summary'] = summary
+        st.session_state['group_plans'] = None
+        if summary and not summary['people']:
+            st.warning("No faces detected. Make sure everyone is in the frame and try again.")
+
+    summary = st.session_state.get('group_summary')
+    if not summary or not summary['people']:
+        return
+
+    st.markdown(f"<h3 style='text-align: center;'>Class Mood: {', '.join(summary['class_moods'])}</h3>", unsafe_allow_html=True)
+    st.caption(f"{len(summary['people'])} participant(s) from {summary['frames']} frame(s): "
+               f"{summary['emotion_passes']} emotion and {summary['identity_passes']} identity inference(s)")
+    user_id = st.session_state.get('user_id')
+    # The participant matched to the logged-in user is only treated as them once they confirm it
+    me = next((person for person in summary['people'] if user_id and person['user_id'] == user_id), None)
+    confirmed = me is not None and st.checkbox(f"I am {me['label']}", key='group_confirm_me')
+    labels = [st.session_state.get('username', 'You') if confirmed and person is me else person['label']
+              for person in summary['people']]
+
+    for person, person_label in zip(summary['people'], labels):
+        st.markdown(f"""
+            <div class='stCard'>
+                <h4>{escape(person_label)}</h4>
+                <p>Moods: {', '.join(person['moods'])} (confidence {person['confidence']:.0%}, {person['frames']} frame(s))</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    plans = st.session_state.get('group_plans')
+    if plans is None or plans['mode'] != plan_mode or plans['confirmed'] != confirmed:
+        with timed('recommend_workouts'):
+            if plan_mode == "Shared class plan":
+                workouts = emotion_plan(summary['class_moods'], user_id)
+                plan_id = save_workout_plan(user_id, 'group', workouts) if user_id and not workouts.empty else None
+                entries = [("Class", workouts, plan_id)]
+            else:
+                entries = []
+                for person, person_label in zip(summary['people'], labels):
+                    # Only the logged-in user's own confirmed plan is personalized and saved to their history
+                    owner = user_id if confirmed and person is me else None
+                    workouts = emotion_plan(person['moods'], owner)
+                    plan_id = save_workout_plan(owner, 'group', workouts) if owner and not workouts.empty else None
+                    entries.append((person_label, workouts, plan_id))
+        plans = st.session_state['group_plans'] = {'mode': plan_mode, 'confirmed': confirmed, 'entries': entries}
+
+    for label, workouts, plan_id in plans['entries']:
+        st.markdown(f"<h3 style='text-align: center;'>{escape(label)} Workout Plan</h3>", unsafe_allow_html=True)
+        if plan_id and st.session_state.get('user_id'):
+            share_controls(st.session_state['user_id'], plan_id, f'group_{label}')
+        st.write("---")
+        show_workout_cards(workouts, plan_id, f'group_cards_{label}')
+
 # Duration-based workout recommendation
 def duration_based_workouts():
     st.markdown("<h1 style='text-align: center;'>Duration-Based Workouts</h1>", unsafe_allow_html=True)
-    duration_options = [15, 30, 45, 60]
+    duration_options = plan_pool.DURATION_OPTIONS
     target_duration = st.selectbox("Workout Duration (minutes)", duration_options, key='duration_select')
     
     if 'duration_recommended_workouts' not in st.session_state:
@@ -439,27 +388,26 @@ def duration_based_workouts():
     if 'duration_plan_id' not in st.session_state:
         st.session_state['duration_plan_id'] = None
 
+    # Plans for every option are computed in the background while the user decides
+    prefetch = plan_prefetch.for_session(st.session_state, st.session_state.get('user_id'),
+                                         recommend_workouts_by_duration)
+
     if st.button("Generate Plan", key='generate_duration'):
-        recommended_workouts = recommend_workouts_by_duration(target_duration)
+        with timed('recommend_workouts_by_duration'):
+            recommended_workouts = prefetch.take(target_duration)
+            if recommended_workouts is None:
+                recommended_workouts = duration_plan(target_duration, st.session_state.get('user_id'))
         total_duration = recommended_workouts['duration'].sum()
         st.session_state['duration_recommended_workouts'] = recommended_workouts
         if recommended_workouts.empty:
             st.warning("No workouts could be selected.")
         else:
             user_id = st.session_state.get('user_id')
-            if user_id:
-                plan_id = save_workout_plan(user_id, 'duration', recommended_workouts)
-                st.session_state['duration_plan_id'] = plan_id
+            plan_id = save_workout_plan(user_id, 'duration', recommended_workouts) if user_id else None
+            st.session_state['duration_plan_id'] = plan_id
             st.markdown(f"<h3 style='text-align: center;'>Your {target_duration}-Minute Workout Plan</h3>", unsafe_allow_html=True)
             st.write("---")
-            for i, row in recommended_workouts.iterrows():
-                st.markdown(f"""
-                    <div class='workout-card'>
-                        <h4><a href="{row['link']}" target="_blank">{i + 1}. {row['name']}</a></h4>
-                        <p>Sets: {row['type']}</p>
-                        <p>Duration: {row['duration']} min</p>
-                    </div>
-                """, unsafe_allow_html=True)
+            show_workout_cards(recommended_workouts, plan_id, 'duration_cards')
 
     recommended_workouts = st.session_state.get('duration_recommended_workouts')
     plan_id = st.session_state.get('duration_plan_id')
@@ -468,8 +416,7 @@ def duration_based_workouts():
 
     if recommended_workouts is not None and not recommended_workouts.empty:
         if user_id and plan_id:
-            if st.button("Share Plan", key='share_duration'):
-                st.code(f"https://your-app-url.com/plan/{plan_id}")
+            share_controls(user_id, plan_id, 'duration')
             
             if user_email and st.button("Email Plan", key='email_duration'):
                 username = st.session_state.get('username', 'User')
@@ -492,7 +439,7 @@ def duration_based_workouts():
             
             if st.button("Mark as Completed", key='complete_duration'):
                 feedback = st.text_area("Optional feedback:", key='feedback_duration')
-                save_progress(user_id, plan_id, True, feedback)
+                save_progress(user_id, plan_id, True, feedback, recommended_workouts['name'])
                 st.success("Workout marked as completed!")
 
 # Workout history
@@ -504,16 +451,8 @@ def workout_history():
         if not plans:
             st.info("No workout plans yet. Start one now!")
         else:
-            for plan in plans:
-                workouts = pd.read_json(plan['data'])
-                st.markdown(f"""
-                    <div class='stCard'>
-                        <h4>{plan['type'].capitalize()} Plan - {plan['created_at']}</h4>
-                        <ul>
-                            {''.join([f"<li>{row['name']} ({row['type']}) - {row['duration']} min</li>" for _, row in workouts.iterrows()])}
-                        </ul>
-                    </div>
-                """, unsafe_allow_html=True)
+            start, end = _page_bounds(len(plans), HISTORY_PAGE_SIZE, 'history')
+            st.markdown(history_cards_html(plans[start:end]), unsafe_allow_html=True)
 
 # Progress dashboard
 def progress_dashboard():
@@ -521,19 +460,12 @@ def progress_dashboard():
     user_id = st.session_state.get('user_id')
     if user_id:
         progress = get_progress(user_id)
-        if not progress:
+        # Older months live on as summaries after maintenance.py retention
+        summaries = get_progress_summaries(user_id)
+        if not progress and not summaries:
             st.info("No progress recorded yet.")
         else:
-            completed = sum(1 for p in progress if p['completed'])
-            streak = 0
-            last_date = None
-            for p in sorted(progress, key=lambda x: x['completed_at']):
-                date = p['completed_at'].split()[0]
-                if p['completed'] and (last_date is None or (pd.to_datetime(date) - pd.to_datetime(last_date)).days == 1):
-                    streak += 1
-                else:
-                    streak = 1 if p['completed'] else 0
-                last_date = date
+            completed, streak = progress_stats(progress, summaries)
             
             st.markdown(f"""
                 <div class='stCard'>
@@ -545,14 +477,11 @@ def progress_dashboard():
             """, unsafe_allow_html=True)
             
             st.markdown("<h3>Recent Activity</h3>", unsafe_allow_html=True)
+            plan_types = {plan['id']: plan['type'] for plan in get_workout_plans(user_id)}
+            activity = []
             for p in progress[:5]:
-                plan = get_workout_plans(user_id)
-                plan_data = next((x for x in plan if x['id'] == p['plan_id']), None)
-                plan_name = plan_data['type'].capitalize() if plan_data else "Unknown"
-                st.markdown(f"""
-                    <div class='stCard'>
-                        <p>{plan_name} Plan - {p['completed_at']}</p>
-                        <p>Status: {'Completed' if p['completed'] else 'Not Completed'}</p>
-                        <p>Feedback: {p['feedback'] or 'None'}</p>
-                    </div>
-                """, unsafe_allow_html=True)
\ No newline at end of file
+                plan_name = plan_types[p['plan_id']].capitalize() if p['plan_id'] in plan_types else "Unknown"
+                activity.append(f"<div class='stCard'><p>{plan_name} Plan - {p['completed_at']}</p>"
+                                f"<p>Status: {'Completed' if p['completed'] else 'Not Completed'}</p>"
+                                f"<p>Feedback: {escape(p['feedback'] or 'None')}</p></div>")
+            st.markdown(''.join(activity), unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import timed
+
+# Write-behind queue for small inserts. Callers enqueue a write function and
+# a single background thread applies queued writes in short transactions
+# (one BEGIN IMMEDIATE ... COMMIT per batch), so concurrent sessions and
+# workers share one write-lock acquisition and one fsync per batch instead
+# of one per row. WRITE_DURABILITY picks the guarantee callers get:
+#   sync   - no queue, every write commits before the call returns
+#   commit - queued and batched, but the call waits until its batch commits;
+#            writes arriving while a batch commits form the next one
+#            (default: a returned id is durable and visible to other processes)
+#   async  - opt-in; the call returns at once, writes commit within
+#            WRITE_MAX_DELAY_MS and are flushed at interpreter exit, so a
+#            crash or kill can lose them
+WRITE_DURABILITY = os.getenv('WRITE_DURABILITY', 'commit')
+WRITE_MAX_DELAY_MS = float(os.getenv('WRITE_MAX_DELAY_MS', '50'))
+WRITE_MAX_BATCH = int(os.getenv('WRITE_MAX_BATCH', '200'))
+WRITE_RETRIES = int(os.getenv('WRITE_RETRIES', '5'))
+WRITE_SHUTDOWN_TIMEOUT = float(os.getenv('WRITE_SHUTDOWN_TIMEOUT', '10'))
+
+DURABILITY_MODES = ('sync', 'commit', 'async')
+
+logger = logging.getLogger(__name__)
+
+# Queue marker that makes the writer commit what it has without waiting out the delay
+_FLUSH = object()
+
+
+class PendingWrite:
+    def __init__(self, func, args, wait):
+        self.func = func
+        self.args = args
+        self.done = threading.Event() if wait else None
+        self.error = None
+
+
+class WriteBehindQueue:
+    def __init__(self, connect):
+        self.connect = connect
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.failed_writes = 0
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self.thread.start()
+
+    # Apply func(conn, *args) according to WRITE_DURABILITY
+    def submit(self, func, *args):
+        if WRITE_DURABILITY not in DURABILITY_MODES:
+            raise ValueError(f"Unsupported WRITE_DURABILITY {WRITE_DURABILITY!r}; choose from {DURABILITY_MODES}")
+        if WRITE_DURABILITY == 'sync':
+            self._commit([PendingWrite(func, args, False)], raise_errors=True)
+            return
+        write = PendingWrite(func, args, WRITE_DURABILITY == 'commit')
+        self._ensure_thread()
+        self.queue.put(write)
+        if write.done is not None:
+            write.done.wait()
+            if write.error is not None:
+                raise write.error
+
+    # Block until everything queued so far is committed (or the timeout passes)
+    def flush(self, timeout=None):
+        if self.queue.unfinished_tasks == 0:
+            return True
+        self._ensure_thread()
+        self.queue.put(_FLUSH)
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(lambda: self.queue.unfinished_tasks == 0, timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Waiting callers are not held back for the delay: whatever queued up
+            # during the previous commit forms the batch
+            delay = WRITE_MAX_DELAY_MS / 1000 if WRITE_DURABILITY == 'async' else 0
+            deadline = time.monotonic() + delay
+            while batch[-1] is not _FLUSH and len(batch) < WRITE_MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [write for write in batch if write is not _FLUSH]
+            try:
+                if writes:
+                    self._commit(writes)
+            except Exception as e:
+                logger.exception("Write-behind batch failed: %s", e)
+                # Waiting callers must not be told a rolled-back write succeeded
+                unreported = [write for write in writes if write.error is None]
+                for write in unreported:
+                    write.error = e
+                self.failed_writes += len(unreported)
+            finally:
+                for write in writes:
+                    if write.done is not None:
+                        write.done.set()
+                for _ in batch:
+                    self.queue.task_done()
+
+    # Commit writes in one transaction, retrying while the database is locked.
+    # If the batch itself is rejected, apply writes one by one so a single bad
+    # row does not take the others down with it.
+    def _commit(self, writes, raise_errors=False):
+        error = None
+        for attempt in range(WRITE_RETRIES):
+            try:
+                self._apply(writes)
+                return
+            except sqlite3.OperationalError as e:
+                error = e
+                time.sleep(0.01 * 2 ** attempt)
+            except Exception as e:
+                # Constraint violations and bad arguments will not succeed on retry
+                error = e
+                break
+        if raise_errors or len(writes) == 1:
+            for write in writes:
+                write.error = error
+            self.failed_writes += len(writes)
+            if raise_errors:
+                raise error
+            logger.error("Dropped write: %s", error)
+            return
+        for write in writes:
+            self._commit([write])
+
+    def _apply(self, writes):
+        conn = self.connect()
+        try:
+            with timed('sqlite_write_batch'):
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for write in writes:
+                        write.func(conn, *write.args)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        finally:
+            conn.close()
+
+    # Forked children start with an empty queue and their own writer thread
+    def reset(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+
+def install(writer):
+    atexit.register(lambda: writer.flush(WRITE_SHUTDOWN_TIMEOUT) or
+                    logger.error("Write-behind queue not drained within %.0fs", WRITE_SHUTDOWN_TIMEOUT))
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=writer.reset)
+    return writer
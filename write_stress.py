@@ -0,0 +1,151 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+# Concurrency stress test for plan/progress writes. Several processes, each
+# with several threads, save plans and progress rows against one temporary
+# SQLite database under every WRITE_DURABILITY mode, then the database is
+# checked: every returned plan id is unique and stored, every progress row
+# points at an existing plan, and nothing was lost after the workers exit.
+
+DEFAULT_MODES = "sync,commit,async"
+
+
+def _plan():
+    import pandas as pd
+    return pd.DataFrame({
+        'name': ['Squats', 'Plank', 'Jumping Jacks'],
+        'type': ['3x12', '3x30 sec', '3x20'],
+        'link': ['https://example.com/1', 'https://example.com/2', 'https://example.com/3'],
+        'duration': [3, 2, 3],
+    })
+
+
+# Runs in a spawned child; the environment already points at the test database
+def _worker(worker_id, threads, iterations, results):
+    import database
+    plan = _plan()
+    plan_ids, errors, latencies = [], [], []
+    lock = threading.Lock()
+
+    def run(thread_id):
+        user_id = worker_id * threads + thread_id + 1
+        for i in range(iterations):
+            # A few distinct plans, so content deduplication is exercised too
+            workouts = plan.iloc[:1 + i % 3]
+            try:
+                start = time.perf_counter()
+                plan_id = database.save_workout_plan(user_id, 'duration', workouts)
+                database.save_progress(user_id, plan_id, bool(i % 2), f"run {i}")
+                elapsed = time.perf_counter() - start
+                with lock:
+                    plan_ids.append(plan_id)
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    # Queued writes are flushed by the atexit hook when the child exits
+    results.put({'plan_ids': plan_ids, 'errors': errors, 'latencies': latencies})
+
+
+def run_mode(mode, db_path, processes, threads, iterations):
+    os.environ['WRITE_DURABILITY'] = mode
+    os.environ['DB_PATH'] = db_path
+    # Workers find the schema in place, as they would in production
+    import database
+    database.DB_PATH = db_path
+    database.init_db()
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start = time.perf_counter()
+    workers = [context.Process(target=_worker, args=(p, threads, iterations, results)) for p in range(processes)]
+    for worker in workers:
+        worker.start()
+    reports = []
+    while len(reports) < len(workers):
+        try:
+            reports.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    plan_ids = [plan_id for report in reports for plan_id in report['plan_ids']]
+    errors = [error for report in reports for error in report['errors']]
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    stored_plans = {row[0] for row in conn.execute('SELECT id FROM workout_plans')}
+    progress_rows = conn.execute('SELECT COUNT(*) FROM progress').fetchone()[0]
+    orphans = conn.execute('SELECT COUNT(*) FROM progress p LEFT JOIN workout_plans w ON w.id = p.plan_id '
+                           'WHERE w.id IS NULL').fetchone()[0]
+    contents = conn.execute('SELECT COUNT(*) FROM plan_contents').fetchone()[0]
+    conn.close()
+
+    expected = processes * threads * iterations
+    problems = []
+    if len(reports) < len(workers):
+        problems.append(f"{len(workers) - len(reports)} worker processes died")
+    if errors:
+        problems.append(f"{len(errors)} write errors, e.g. {errors[0]}")
+    if len(set(plan_ids)) != len(plan_ids):
+        problems.append(f"{len(plan_ids) - len(set(plan_ids))} duplicate plan ids returned")
+    missing = set(plan_ids) - stored_plans
+    if missing:
+        problems.append(f"{len(missing)} returned plan ids not stored")
+    if len(stored_plans) != expected or progress_rows != expected:
+        problems.append(f"expected {expected} plans and progress rows, found {len(stored_plans)} and {progress_rows}")
+    if orphans:
+        problems.append(f"{orphans} progress rows reference missing plans")
+
+    return {
+        'mode': mode,
+        'writes': expected * 2,
+        'seconds': elapsed,
+        'writes_per_second': expected * 2 / elapsed,
+        'call_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'call_p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else None,
+        'plan_contents': contents,
+        'problems': problems,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress concurrent plan/progress writes.")
+    parser.add_argument('--modes', default=DEFAULT_MODES, help="Comma-separated WRITE_DURABILITY modes to run")
+    parser.add_argument('--processes', type=int, default=4, help="Writer processes")
+    parser.add_argument('--threads', type=int, default=8, help="Writer threads per process")
+    parser.add_argument('--iterations', type=int, default=50, help="Plans saved per thread")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='wellness-stress-')
+    failed = False
+    reports = []
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        report = run_mode(mode, os.path.join(directory, f'{mode}.db'), args.processes, args.threads, args.iterations)
+        reports.append(report)
+        status = 'ok' if not report['problems'] else 'FAILED: ' + '; '.join(report['problems'])
+        print(f"{mode:7} {report['writes_per_second']:9.0f} writes/s  "
+              f"p50 {report['call_p50_ms']:7.2f} ms  p99 {report['call_p99_ms']:7.2f} ms  {status}", file=sys.stderr)
+        failed = failed or bool(report['problems'])
+    print(json.dumps(reports, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())